@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+import os
+
+# Sequence Ontology consequence terms reported by VEP, ordered by severity.
+# Term i is bit i of the 'Consequence_mask' column of the variants database;
+# terms not listed here are appended to the list of the database as found
+so_terms = ['transcript_ablation', 'splice_acceptor_variant',
+            'splice_donor_variant', 'stop_gained', 'frameshift_variant',
+            'stop_lost', 'start_lost', 'transcript_amplification',
+            'feature_elongation', 'feature_truncation', 'inframe_insertion',
+            'inframe_deletion', 'missense_variant', 'protein_altering_variant',
+            'splice_donor_5th_base_variant', 'splice_region_variant',
+            'splice_donor_region_variant', 'splice_polypyrimidine_tract_variant',
+            'incomplete_terminal_codon_variant', 'start_retained_variant',
+            'stop_retained_variant', 'synonymous_variant',
+            'coding_sequence_variant', 'mature_miRNA_variant',
+            '5_prime_UTR_variant', '3_prime_UTR_variant',
+            'non_coding_transcript_exon_variant', 'intron_variant',
+            'NMD_transcript_variant', 'non_coding_transcript_variant',
+            'coding_transcript_variant', 'upstream_gene_variant',
+            'downstream_gene_variant', 'TFBS_ablation', 'TFBS_amplification',
+            'TF_binding_site_variant', 'regulatory_region_ablation',
+            'regulatory_region_amplification', 'regulatory_region_variant',
+            'intergenic_variant', 'sequence_variant']
+
+# file of the variants database listing its consequence terms, one per line
+terms_file = 'consequence.terms'
+
+# terms with a bit in 'Consequence_mask'. awk computes the mask as a double,
+# exact up to 2^53, so later terms are listed but get no bit
+mask_bits = 53
+
+
+def init_terms(out_dir):
+    '''
+    Write the list of consequence terms of a variants database, unless it
+    already exists so that the bits of previous files are kept.
+
+    Parameters
+    ----------
+    out_dir : str
+        Path to the variants database.
+
+    Returns
+    -------
+    str
+        Path to the list of terms.
+    '''
+    path = os.path.join(out_dir, terms_file)
+    if not os.path.isfile(path):
+        with open(path, 'w') as f:
+            f.write('\n'.join(so_terms) + '\n')
+    return path
+
+
+def count_terms(out_dir):
+    '''
+    Number of consequence terms listed in a variants database.
+    '''
+    with open(os.path.join(out_dir, terms_file)) as f:
+        return sum(1 for t in f.read().splitlines() if t != '')
@@ -9,32 +9,63 @@ from halo import Halo
 from .decorator import tags
 from .logger import get_logger
 from .parse_argv import parse_commandline
+from .run_subprocess import call_subprocess
 
-# add decorator to main function
-@tags(text_start="Split file by selected ensembl id...This might take up some time...",
-      text_succeed="Split file by selected ensembl id...done.",
-      text_fail="Split file by selected ensembl id...failed!",
-      emoji="\U00002702")
-def index(input_file, out_dir, log_dir):
+# one line per variant id (uploaded or existing variation), its gene and
+# transcript, sorted byte-wise so that it can be binary searched
+sorted_index_cmd = "grep -v '##' {0} | \
+sed -e '1s/^#//' | \
+awk -v vi=\"{1}\" -v ei=\"{2}\" -v gi=\"{3}\" -v ti=\"{4}\" \
+-F ' ' 'NR>1 {{print $vi, $gi, $ti; \
+if (ei > 0) {{n=split($ei, ids, \",\"); \
+for (i=1; i<=n; i++) {{if (ids[i] != \"-\" && ids[i] != $vi) print ids[i], $gi, $ti}}}}}}' | \
+LC_ALL=C sort -u -T {5} > {6}"
+
+
+def index(input_file, out_dir, log_dir, col_index_varid, col_index_namevarid,
+          col_index_geneid, col_index_transcriptid):
     '''
     Index variants file.
 
     Parameters
     ----------
-    prefix : str
-        Ensembl ID prefix. Either ESNG or ENSP.
     input_file : str
         Path to infile.
     out_dir : str
         Path to output.
-    out_extension : str
-        Output filename extension
+    log_dir : str
+        Path to log file.
+    col_index_varid : str
+        Column number of 'Uploaded_variation'.
+    col_index_namevarid : str
+        Column number of 'Existing_variation', 0 if missing.
+    col_index_geneid : str
+        Column number of 'Gene'.
+    col_index_transcriptid : str
+        Column number of 'Feature'.
 
     Returns
     -------
     indexed_file
-        1st column is variants ids and the 2nd the corresponding gene ids
+        1st column is variants ids, the 2nd the corresponding gene ids
+        and the 3rd the corresponding transcript ids, sorted by variant id
     '''
     # log file
     logger = get_logger('create index', log_dir)
-    logger.info('Creating index file.')
\ No newline at end of file
+    logger.info('Creating sorted index file.')
+    # command
+    cmd = sorted_index_cmd.format(input_file,
+                                  col_index_varid,
+                                  col_index_namevarid,
+                                  col_index_geneid,
+                                  col_index_transcriptid,
+                                  out_dir,
+                                  os.path.join(out_dir, 'variants.index.sorted'))
+    # register process
+    out, err = call_subprocess(cmd)
+    # error handling
+    if err is None:
+        logger.info('This file was indexed correctly.')
+    else:
+        logger.error('This file could not be indexed')
+        raise IOError()
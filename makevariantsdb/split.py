@@ -10,6 +10,8 @@ from .decorator import tags
 from .logger import get_logger
 from .parse_argv import parse_commandline
 from .run_subprocess import call_subprocess
+from .create_var_index import index
+from .consequences import init_terms, count_terms, mask_bits
 
 
 # sort file 
@@ -28,6 +30,26 @@ awk -v ci=\"{1}\" \
 !seen[$ci]++{{f=od$ci\".{3}\"; print h >> f}}; \
 {{f=od$ci\".{3}\"; print >> f; close(f)}}'"
 
+# same as split_cmd, adding two columns to every row: 'Is_coding' (1 if the
+# amino acids column has any amino acid letter) and 'Consequence_mask' (bit i
+# set for the i-th term of the consequence terms file, which gets the terms
+# not listed yet appended). Only the first mask_bits terms get a bit, so
+# that the mask stays exact as a double
+split_flags_cmd = "grep -v '##' {0} | \
+sed -e '1s/^#//' | \
+awk -v ci=\"{1}\" \
+-v od=\"{2}/\" \
+-v ai=\"{4}\" -v qi=\"{5}\" -v tf=\"{6}\" \
+-F ' ' 'BEGIN {{while ((getline t < tf) > 0) if (t != \"\") bit[t] = nt++; close(tf)}}; \
+NR==1 {{h=$0 \"\\tIs_coding\\tConsequence_mask\"; next}}; \
+{{n=split($qi, cs, \",\"); m=0; delete on; \
+for (i=1; i<=n; i++) {{if (cs[i] == \"-\" || cs[i] in on) continue; on[cs[i]]; \
+if (!(cs[i] in bit)) {{bit[cs[i]] = nt++; print cs[i] >> tf}}; \
+if (bit[cs[i]] < {7}) m += 2^bit[cs[i]]}}; \
+c = ($ai ~ /[IMTNKSRLPHQVADEGFYCWX]/) ? 1 : 0}}; \
+!seen[$ci]++{{f=od$ci\".{3}\"; print h >> f}}; \
+{{f=od$ci\".{3}\"; printf \"%s\\t%d\\t%.0f\\n\", $0, c, m >> f; close(f)}}'"
+
 split_cmd_parallel = "grep -v '##' {0} | \
 sed -e '1s/^#//' | parallel -j {4} --pipe --header '(U.*\n)*' -q \
 awk -v ci=\"{1}\" \
@@ -115,19 +137,31 @@ def request(prefix, input_file, out_dir, out_extension, log_dir,sort, parallel,
     
 
     # command
-    #cmd3 = detect_column.format( input_file,'Existing_variation')
+    cmd3 = detect_column.format( input_file,'Existing_variation')
     # execute subprocess
-    #out3, err3 = call_subprocess(cmd3)
+    out3, err3 = call_subprocess(cmd3)
     # error handling
-    #if err3 is None and out3 != b'':
-    #    col_index_namevarid = str(re.findall('\d+', out3.decode('utf8'))[0]) #', $' + \
-            
-    #    logger.info('\'Existing_variation\' columnd found.')
-    #else:
+    if err3 is None and out3 != b'':
+        col_index_namevarid = str(re.findall('\d+', out3.decode('utf8'))[0])
+        logger.info('\'Existing_variation\' column found.')
+    else:
         # if 'Existing_variation' column does not exist
-    #    col_index_namevarid = ' '
-    #    logger.error(
-    #        'This file will be indexed without the column \'Existing_variation\' wich contains variants ids.')
+        col_index_namevarid = '0'
+        logger.error(
+            'This file will be indexed without the column \'Existing_variation\' wich contains variants ids.')
+
+    # columns to precompute the coding flag and the consequence bitmask
+    col_index_aa, col_index_consequence = '0', '0'
+    for name in ['Amino_acids', 'Consequence']:
+        out_c, err_c = call_subprocess(detect_column.format(input_file, name))
+        if err_c is None and out_c != b'':
+            if name == 'Amino_acids':
+                col_index_aa = re.findall('\d+', out_c.decode('utf8'))[0]
+            else:
+                col_index_consequence = re.findall('\d+', out_c.decode('utf8'))[0]
+    if '0' in (col_index_aa, col_index_consequence):
+        logger.error('\'Amino_acids\' or \'Consequence\' column missing. '
+                     'Coding and consequence flags will be computed when mapping.')
 
     # detect if there is output
     # stop if no ENSG id detected
@@ -151,8 +185,13 @@ def request(prefix, input_file, out_dir, out_extension, log_dir,sort, parallel,
         #        input_file, col_index_transcriptid, out_dir, out_extension, njobs)
 
         #else:
-        cmd4 = split_cmd.format(
-                input_file, col_index_transcriptid, out_dir, out_extension)
+        if '0' in (col_index_aa, col_index_consequence):
+            cmd4 = split_cmd.format(
+                    input_file, col_index_transcriptid, out_dir, out_extension)
+        else:
+            cmd4 = split_flags_cmd.format(
+                    input_file, col_index_transcriptid, out_dir, out_extension,
+                    col_index_aa, col_index_consequence, init_terms(out_dir), mask_bits)
         # register process
         out4, err4 = call_subprocess(cmd4)
         # error handling
@@ -161,6 +200,9 @@ def request(prefix, input_file, out_dir, out_extension, log_dir,sort, parallel,
         else:
             logger.error('This file could not be splitted')
             raise IOError()
+        if '0' not in (col_index_aa, col_index_consequence) and count_terms(out_dir) > mask_bits:
+            logger.warning('More than {} consequence terms. Consequences will be selected '
+                           'from the Consequence column when mapping.'.format(mask_bits))
 
         # create index file
         cmd5 = index_file.format(input_file,
@@ -178,6 +220,15 @@ def request(prefix, input_file, out_dir, out_extension, log_dir,sort, parallel,
         else:
             logger.error('This file could not be indexed')
             raise IOError()
+
+        # create sorted index of uploaded and existing variation ids
+        index(input_file,
+              out_dir,
+              log_dir,
+              col_index_varid,
+              col_index_namevarid,
+              col_index_geneid,
+              col_index_transcriptid)
     else:
         logger.error('The input file has zero gene entries.')
         raise IOError()
@@ -2,7 +2,23 @@
 
 #"""pdbmapper.__main__: executed when bootstrap directory is called as script."""
 
-from .execute_mapper import main
+import sys
+
+from .execute_mapper import main as run_mapper
+from .convert import main as convert
+from .pack import main as pack
+from .compact import main as compact
+from .merge import main as merge
+
+# subcommands, given as first argument: mapper <subcommand> [options]
+commands = {'convert': convert, 'pack': pack, 'compact': compact, 'merge': merge}
+
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] in commands:
+        return commands[sys.argv.pop(1)]()
+    run_mapper()
+
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,138 @@
+# coding: utf-8
+
+# Import necesary modules
+import pandas as pd
+import numpy as np
+
+from .db_parser import projection
+from .logger import get_logger
+from .mapper import load_variants, locate, parse_structures, unstructured, write_results
+from .planner import largest_first, row_bytes
+from .stats import peak_rss
+from .writer import set_queue
+
+def chunk_tasks(tasks, budget):
+    '''
+    Split the tasks into chunks whose variants and structural data fit
+    in a memory budget.
+
+    Parameters
+    ----------
+    tasks : df
+        One row per transcript and protein to map ('transcriptID' and
+        'protID' columns), with their costs, as returned by task_costs.
+    budget : int
+        Memory budget of each chunk in bytes.
+
+    Returns
+    -------
+    list
+        Chunks of tasks, largest first. Tasks of the same protein are kept
+        together.
+    '''
+    tasks = tasks.sort_values('protID', kind='mergesort').reset_index(drop=True)
+    chunks, sizes, start, size, proteins = [], [], 0, 0, set()
+    for i, (p, var_rows, struct_rows) in enumerate(
+            zip(tasks['protID'], tasks['var_rows'], tasks['struct_rows'])):
+        cost = var_rows * row_bytes
+        if p not in proteins:
+            cost += struct_rows * row_bytes
+        if size + cost > budget and i > start and p not in proteins:
+            chunks.append(tasks.iloc[start:i])
+            sizes.append(size)
+            start, size, proteins = i, 0, set()
+        size += cost
+        proteins.add(p)
+    if start < len(tasks):
+        chunks.append(tasks.iloc[start:])
+        sizes.append(size)
+    return largest_first(chunks, sizes)
+
+
+def concat_frames(frames):
+    '''
+    Concatenate frames keeping their categorical columns categorical.
+    '''
+    df = pd.concat(frames, ignore_index=True, sort=False)
+    categorical = [c for c in frames[0].columns
+                   if isinstance(frames[0][c].dtype, pd.CategoricalDtype)]
+    return df.astype({c: 'category' for c in categorical if c in df.columns})
+
+
+def map_chunk(chunk, psdb, vardb, out_dir, pident, evalue, isoform, consequence, loc, csv=False, hdf=False, queue=None, parquet=False):
+    '''
+    Map the variants of many transcripts to the structural data of their
+    proteins at once: every file of the chunk is parsed once and
+    concatenated, and a single join locates all the positions.
+
+    Parameters
+    ----------
+    chunk : df
+        Tasks to map, with 'transcriptID', 'protID', 'APPRIS' and, if
+        variants are selected by id, 'varid' columns.
+    queue : Queue
+        Queue of the output writer, if any.
+
+    Returns
+    -------
+    dict
+        Tasks mapped and peak memory of the worker.
+    '''
+    logger = get_logger('batch', out_dir)
+    set_queue(queue)
+    var_columns, struct_columns = projection(csv or parquet, hdf)
+    chunk = chunk.reset_index(drop=True)
+
+    # structural data of every protein, sorted by protein and position
+    proteins = list(dict.fromkeys(chunk['protID']))
+    structures = []
+    for code, p in enumerate(proteins):
+        try:
+            psdf = parse_structures(p, psdb, pident, evalue, struct_columns, logger)
+        except IOError:
+            continue
+        structures.append(psdf.assign(_protein=np.int32(code)))
+
+    # variants of every transcript
+    transcripts = list(dict.fromkeys(chunk['transcriptID']))
+    var_ids = dict(zip(chunk['transcriptID'], chunk['varid'])) if 'varid' in chunk.columns else {}
+    variants = []
+    for code, t in enumerate(transcripts):
+        try:
+            annovars = load_variants(t, vardb, consequence, var_ids.get(t), var_columns, logger)
+        except IOError:
+            continue
+        variants.append(annovars.assign(_transcript=np.int32(code)))
+    if not variants:
+        return {'tasks': 0, 'peak_rss': peak_rss()}
+
+    # one row per variant and task of its transcript
+    tasks = pd.DataFrame({
+        '_transcript': chunk['transcriptID'].map({t: i for i, t in enumerate(transcripts)}).astype(np.int32),
+        '_task': np.arange(len(chunk), dtype=np.int32),
+        '_protein': chunk['protID'].map({p: i for i, p in enumerate(proteins)}).astype(np.int32),
+        '_accession': chunk['protID'].astype('category')})
+    if chunk['APPRIS'].notna().any():
+        tasks['APPRIS_isoform'] = chunk['APPRIS'].values
+    annovars = concat_frames(variants).merge(tasks, on='_transcript', sort=False)
+    annovars = annovars.drop(columns='_transcript')
+
+    if consequence is None:
+        consequence = ['all']
+    if isoform is None:
+        isoform = ['all']
+    pident = float(pident)
+    if structures:
+        psdf = concat_frames(structures)
+        structured = annovars['_protein'].isin(psdf['_protein'].unique()).to_numpy()
+        write_results(None, out_dir, pident, isoform, consequence,
+                      locate(annovars.loc[structured], psdf, None, loc, '_protein'), csv, hdf, parquet)
+        annovars = annovars.loc[~structured]
+    # proteins without structural data
+    if loc and not annovars.empty:
+        write_results(None, out_dir, pident, isoform, consequence,
+                      unstructured(annovars), csv, hdf, parquet)
+    logger.info('Batch of {} transcripts and {} proteins mapped.'.format(
+        len(transcripts), len(proteins)))
+    return {'tasks': len(chunk), 'peak_rss': peak_rss()}
+
@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+
+# import necessary modules
+import os
+
+# version of the columnar layout of the databases, stored in every file
+SCHEMA_VERSION = 1
+
+# magic bytes of the columnar formats
+magic = {'arrow': b'ARROW1', 'parquet': b'PAR1'}
+
+# file extension of the columnar formats
+extensions = {'arrow': '.arrow', 'parquet': '.parquet'}
+
+
+def detect_format(path):
+    '''
+    Format of a database file: 'arrow', 'parquet' or 'text'.
+    '''
+    with open(path, 'rb') as f:
+        head = f.read(6)
+    for fmt, m in magic.items():
+        if head.startswith(m):
+            return fmt
+    return 'text'
+
+
+def write_columnar(df, path, schema, fmt='arrow', sources=()):
+    '''
+    Write a parsed database file in a columnar format.
+
+    Parameters
+    ----------
+    df : df
+        Typed data frame of a variants or structural database file.
+    path : str
+        Output file.
+    schema : str
+        Database the file belongs to, 'variants' or 'structural'.
+    fmt : str
+        'arrow' (Arrow IPC, uncompressed to be memory-mapped) or 'parquet'.
+    sources : list
+        Names of the text files of the database it was converted from.
+    '''
+    import pyarrow as pa
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    table = table.replace_schema_metadata(dict(
+        table.schema.metadata or {},
+        **{'3dmapper.schema': schema,
+           '3dmapper.schema_version': str(SCHEMA_VERSION),
+           '3dmapper.sources': '\t'.join(sources)}))
+    tmp = path + '.tmp'
+    if fmt == 'arrow':
+        with pa.OSFile(tmp, 'wb') as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+    else:
+        import pyarrow.parquet as pq
+        pq.write_table(table, tmp)
+    os.replace(tmp, path)
+
+
+def read_columnar(path, fmt, columns=None):
+    '''
+    Read a database file in a columnar format, memory-mapped if possible.
+
+    Parameters
+    ----------
+    path : str or memoryview
+        Input file, or its bytes if it is packed.
+    fmt : str
+        'arrow' or 'parquet'.
+    columns : list
+        Columns to read, all of them if None.
+
+    Returns
+    -------
+    df
+        Parsed file.
+    '''
+    import pyarrow as pa
+    if not isinstance(path, str):
+        source = pa.BufferReader(pa.py_buffer(path))
+        if fmt == 'arrow':
+            table = pa.ipc.open_file(source).read_all()
+        else:
+            import pyarrow.parquet as pq
+            table = pq.read_table(source)
+        path = 'packed file'
+    elif fmt == 'arrow':
+        with pa.memory_map(path) as source:
+            table = pa.ipc.open_file(source).read_all()
+    else:
+        import pyarrow.parquet as pq
+        table = pq.read_table(path, memory_map=True)
+    metadata = table.schema.metadata or {}
+    version = int(metadata.get(b'3dmapper.schema_version', 0))
+    if version > SCHEMA_VERSION:
+        raise IOError('{} has schema version {}, newer than the supported version {}.'.format(
+            path, version, SCHEMA_VERSION))
+    if columns is not None:
+        table = table.select([c for c in table.column_names if c in columns])
+    return table.to_pandas()
+
+
+def columnar_rows(path, fmt):
+    '''
+    Number of rows of a database file in a columnar format.
+    '''
+    import pyarrow as pa
+    if fmt == 'arrow':
+        with pa.memory_map(path) as source:
+            reader = pa.ipc.open_file(source)
+            return sum(reader.get_batch(i).num_rows
+                       for i in range(reader.num_record_batches))
+    import pyarrow.parquet as pq
+    return pq.ParquetFile(path).metadata.num_rows
+
+
+def columnar_sources(path, fmt):
+    '''
+    Names of the text files a columnar database file was converted from.
+
+    Parameters
+    ----------
+    path : str or memoryview
+        Input file, or its bytes if it is packed.
+    fmt : str
+        'arrow' or 'parquet'.
+
+    Returns
+    -------
+    set
+        Names of the text files, empty for files written before they
+        were recorded.
+    '''
+    import pyarrow as pa
+    source = pa.BufferReader(pa.py_buffer(path)) if not isinstance(path, str) \
+        else pa.memory_map(path)
+    with source:
+        if fmt == 'arrow':
+            schema = pa.ipc.open_file(source).schema
+        else:
+            import pyarrow.parquet as pq
+            schema = pq.read_schema(source)
+    sources = (schema.metadata or {}).get(b'3dmapper.sources', b'').decode()
+    return set(s for s in sources.split('\t') if s)
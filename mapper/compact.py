@@ -0,0 +1,244 @@
+# coding: utf-8
+
+# Import necesary modules
+import os
+import re
+import glob
+import argparse
+
+from joblib import Parallel, delayed
+
+from .logger import get_logger
+
+# name of the shard of a protein: the prefix of the run parameters is the
+# shortest one leaving a protein or transcript ID (UniProt, Ensembl or
+# without underscores) at the end
+shard_name = re.compile(
+    r'^(?P<prefix>.+?_consequence_.+?)_(?P<id>(?:sp|tr)\|.+|ENS[A-Z]*[0-9].*|[^_]+)\.hdf5$')
+
+# group of the compacted files with the row range of each protein
+INDEX = 'index'
+
+
+def parse_commandline():
+    '''
+    Parse inputs of the compact subcommand from command line.
+
+    Returns
+    -------
+    args
+        arguments to give to the functions
+    '''
+    parser = argparse.ArgumentParser(
+        prog='mapper compact',
+        description='Merge the per-protein HDF5 files written by -hdf into one '
+                    'file per map type, sorted by protein and position, with '
+                    'the row range of every protein.')
+    parser.add_argument('-o', '--out', dest='out', metavar='<String>', required=True,
+                        help='output directory of a 3Dmapper run')
+    parser.add_argument('-j', '--jobs', dest='njobs', metavar='<int>', type=int,
+                        default=1, help='number of files to compact in parallel')
+    parser.add_argument('--chunk-size', dest='chunk_size', metavar='<int>', type=int,
+                        default=1000000, help='rows written at once. Default is 1000000')
+    parser.add_argument('--batch-files', dest='batch_files', metavar='<int>', type=int,
+                        default=256, help='files merged at once. Default is 256')
+    parser.add_argument('--keep', dest='keep', action='store_true', default=False,
+                        help='keep the per-protein files')
+    args = parser.parse_args()
+    del(parser)
+    return args
+
+
+def find_shards(hdf_dir):
+    '''
+    Per-protein files of a run, grouped by map type and run parameters.
+
+    Parameters
+    ----------
+    hdf_dir : str
+        hdf5 directory of the output of a run.
+
+    Returns
+    -------
+    dict
+        Compacted file path -> list of (ID, shard path) sorted by ID.
+    '''
+    groups = {}
+    for path in glob.glob(os.path.join(hdf_dir, '*', '*.hdf5')):
+        match = shard_name.match(os.path.basename(path))
+        if match is None:
+            continue
+        out_file = os.path.join(hdf_dir, match.group('prefix') + '.hdf5')
+        groups.setdefault(out_file, []).append((match.group('id'), path))
+    return {k: sorted(v) for k, v in groups.items()}
+
+
+def export_frames(frames, path, chunk_size):
+    '''
+    Write vaex data frames one after another into an HDF5 file.
+    '''
+    import vaex
+    vaex.concat(frames).export_hdf5(path, chunk_size=chunk_size)
+
+
+def read_index(path):
+    '''
+    Row range of each ID of a compacted file.
+
+    Returns
+    -------
+    dict
+        ID -> (start, stop).
+    '''
+    import h5py
+    with h5py.File(path, 'r') as f:
+        index = f[INDEX]
+        return {id: (int(start), int(stop)) for id, start, stop in
+                zip(index['id'].asstr()[:], index['start'][:], index['stop'][:])}
+
+
+def compact_group(out_file, shards, chunk_size, batch_files=256):
+    '''
+    Merge the per-protein files of a map type into one HDF5 file.
+
+    Shards are memory mapped and sorted by position, and written in ID
+    order by batches of at most batch_files files into part files, which
+    are then merged the same way until one is left. Only batch_files files
+    are open at once and vaex writes every part in chunks without loading
+    it into memory. If the file was already compacted, its rows are
+    merged with those of the new shards, before them for the same ID. The
+    row range of each ID is saved in the 'index' group of the file
+    (datasets 'id', 'start' and 'stop').
+
+    Parameters
+    ----------
+    out_file : str
+        Compacted file.
+    shards : list
+        (ID, path) of the shards, sorted by ID.
+    chunk_size : int
+        Rows written at once.
+    batch_files : int
+        Files merged at once.
+
+    Returns
+    -------
+    int
+        Rows written.
+    '''
+    import vaex
+    import h5py
+    import numpy as np
+    # rows compacted before, read as slices of the compacted file
+    compacted = vaex.open(out_file) if os.path.exists(out_file) else None
+    previous = read_index(out_file) if compacted is not None else {}
+    new = {}
+    for id, path in shards:
+        new.setdefault(id, []).append(path)
+
+    base = out_file[:-len('.hdf5')]
+    parts, ids, lengths = [], [], []
+    frames, opened = [], []
+
+    def write_part():
+        path = '{}.part0-{}.hdf5'.format(base, len(parts))
+        export_frames(frames, path, chunk_size)
+        for df in opened:
+            df.close()
+        parts.append(path)
+        frames.clear()
+        opened.clear()
+
+    for id in sorted(set(previous) | set(new)):
+        length = 0
+        if id in previous:
+            start, stop = previous[id]
+            frames.append(compacted[start:stop])
+            length += stop - start
+        for path in new.get(id, []):
+            df = vaex.open(path)
+            opened.append(df)
+            if 'Protein_position' in df.get_column_names() and df['Protein_position'].dtype.is_numeric:
+                df = df.sort('Protein_position')
+            frames.append(df)
+            length += len(df)
+        ids.append(id)
+        lengths.append(length)
+        if len(frames) >= batch_files:
+            write_part()
+    if frames:
+        write_part()
+    if compacted is not None:
+        compacted.close()
+
+    # merge the parts, batch_files at a time
+    level = 0
+    while len(parts) > 1:
+        level += 1
+        merged = []
+        for i in range(0, len(parts), batch_files):
+            group = parts[i:i + batch_files]
+            if len(group) == 1:
+                merged.extend(group)
+                continue
+            frames = [vaex.open(p) for p in group]
+            path = '{}.part{}-{}.hdf5'.format(base, level, len(merged))
+            export_frames(frames, path, chunk_size)
+            for df in frames:
+                df.close()
+            for p in group:
+                os.remove(p)
+            merged.append(path)
+        parts = merged
+
+    stop = np.cumsum(lengths, dtype=np.int64)
+    with h5py.File(parts[0], 'a') as f:
+        index = f.create_group(INDEX)
+        index.create_dataset('id', data=np.array(ids, dtype=h5py.string_dtype()))
+        index.create_dataset('start', data=stop - np.asarray(lengths, dtype=np.int64))
+        index.create_dataset('stop', data=stop)
+    os.replace(parts[0], out_file)
+    return int(stop[-1]) if len(stop) else 0
+
+
+def compacted_rows(path, id):
+    '''
+    Rows of an ID in a compacted file.
+
+    Parameters
+    ----------
+    path : str
+        Compacted file.
+    id : str
+        Protein or transcript ID.
+
+    Returns
+    -------
+    vaex df
+        Rows of the ID, None if it is not in the file.
+    '''
+    import vaex
+    rows = read_index(path).get(id)
+    if rows is None:
+        return None
+    return vaex.open(path)[rows[0]:rows[1]]
+
+
+def main():
+    # parse command line options
+    args = parse_commandline()
+    logger = get_logger('compact', args.out)
+    hdf_dir = os.path.join(args.out, 'hdf5')
+    groups = find_shards(hdf_dir)
+    logger.info('Compacting {} files into {} files.'.format(
+        sum(len(v) for v in groups.values()), len(groups)))
+    rows = Parallel(n_jobs=args.njobs)(
+        delayed(compact_group)(out_file, shards, args.chunk_size, args.batch_files)
+        for out_file, shards in groups.items())
+    for (out_file, shards), n in zip(groups.items(), rows):
+        logger.info('{}: {} files, {} rows.'.format(out_file, len(shards), n))
+        if not args.keep:
+            for id, path in shards:
+                os.remove(path)
+    print('{} files compacted into {} files in {}.'.format(
+        sum(len(v) for v in groups.values()), len(groups), hdf_dir))
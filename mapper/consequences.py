@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+
+# import necessary modules
+import os
+import re
+
+# file of the variants database listing its consequence terms, one per
+# line, and number of them with a bit in 'Consequence_mask', as written by
+# makevariantsdb
+from makevariantsdb.consequences import mask_bits, terms_file
+
+# consequence terms of the variants databases loaded by this process
+_terms = {}
+
+
+def load_terms(vardb):
+    '''
+    Consequence terms of a variants database, term i being bit i of its
+    'Consequence_mask' column. None if the database has no such column,
+    or more terms than bits in the mask.
+    '''
+    path = os.path.abspath(vardb)
+    if path not in _terms:
+        try:
+            with open(os.path.join(vardb, terms_file)) as f:
+                _terms[path] = [t for t in f.read().splitlines() if t != '']
+        except OSError:
+            _terms[path] = None
+        if _terms[path] is not None and len(_terms[path]) > mask_bits:
+            # later terms have no bit, select on the Consequence column
+            _terms[path] = None
+    return _terms[path]
+
+
+def consequence_bits(terms, consequence):
+    '''
+    Bitmask of the terms matching any of the selected consequences, as
+    they would match the Consequence column.
+    '''
+    pattern = re.compile('|'.join(consequence))
+    return sum(1 << i for i, t in enumerate(terms) if pattern.search(t))
+
+
+def select_consequences(df, consequence, vardb):
+    '''
+    Filter variants by consequence type.
+
+    Parameters
+    ----------
+    df : df
+        Variants of a transcript.
+    consequence : list
+        Consequence types (regular expressions) to keep.
+    vardb : str
+        Directory of the variants database.
+
+    Returns
+    -------
+    df
+        Variants with any of the selected consequences.
+    '''
+    terms = load_terms(vardb)
+    if terms is not None and 'Consequence_mask' in df.columns:
+        bits = consequence_bits(terms, consequence)
+        return df[(df['Consequence_mask'].to_numpy() & bits) != 0]
+    # database created without the precomputed columns
+    return df[df['Consequence'].astype(str).str.contains('|'.join(consequence))]
+
+
+def coding_mask(df, aa):
+    '''
+    Whether each variant changes any amino acid of the list aa.
+    '''
+    if 'Is_coding' in df.columns:
+        return df['Is_coding'].to_numpy() == 1
+    # database created without the precomputed columns
+    return df.Amino_acids.str.contains('|'.join(aa), regex=True, na=False).to_numpy()
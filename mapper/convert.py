@@ -0,0 +1,91 @@
+# coding: utf-8
+
+# Import necesary modules
+import os
+import argparse
+import pandas as pd
+
+from joblib import Parallel, delayed
+
+from .columnar import write_columnar, extensions
+from .db_parser import detect_schema, read_entry, structural_dtypes, variants_dtypes
+from .logger import get_logger
+from .manifest import build_manifest
+
+
+def parse_commandline():
+    '''
+    Parse inputs of the convert subcommand from command line.
+
+    Returns
+    -------
+    args
+        arguments to give to the functions
+    '''
+    parser = argparse.ArgumentParser(
+        prog='mapper convert',
+        description='Rewrite a varDB or structuralDB into typed columnar files. '
+                    'The text files are kept and remain readable.')
+    parser.add_argument('-db', dest='db', metavar='<String>', required=True,
+                        help='variants or structural database directory')
+    parser.add_argument('-o', '--out', dest='out', metavar='<String>',
+                        help='output directory. Default is the database directory')
+    parser.add_argument('--format', dest='format', choices=['arrow', 'parquet'],
+                        default='arrow',
+                        help='Arrow IPC (memory-mapped when read, default) or Parquet')
+    parser.add_argument('-j', '--jobs', dest='njobs', metavar='<int>', type=int,
+                        default=1, help='number of jobs to run in parallel')
+    args = parser.parse_args()
+    del(parser)
+    return args
+
+
+def convert_file(entry, db_dir, out_dir, fmt):
+    '''
+    Rewrite one text file of a database in a columnar format.
+
+    Parameters
+    ----------
+    entry : dict
+        Manifest entry of the file.
+    db_dir : str
+        Database directory.
+    out_dir : str
+        Output directory.
+    fmt : str
+        'arrow' or 'parquet'.
+
+    Returns
+    -------
+    str
+        Database the file belongs to, None if it is not a database file.
+    '''
+    path = os.path.join(db_dir, entry['file'])
+    schema = detect_schema(read_entry(path, entry, nrows=0).columns)
+    if schema is None:
+        return None
+    dtype = structural_dtypes if schema == 'structural' else variants_dtypes
+    df = read_entry(path, entry, dtype=dtype)
+    write_columnar(df, os.path.join(out_dir, entry['id'] + extensions[fmt]), schema, fmt,
+                   sources=[entry['name']])
+    return schema
+
+
+def main():
+    # parse command line options
+    args = parse_commandline()
+    out_dir = args.out if args.out is not None else args.db
+    os.makedirs(out_dir, exist_ok=True)
+    # log in the working directory, not in the database
+    logger = get_logger('convert', os.getcwd())
+    # text files of the database
+    manifest = build_manifest(args.db)
+    entries = manifest[manifest['format'] == 'text'].drop_duplicates('id')
+    logger.info('Converting {} files of {} to {}.'.format(len(entries), args.db, args.format))
+    schemas = Parallel(n_jobs=args.njobs)(
+        delayed(convert_file)(entry, args.db, out_dir, args.format)
+        for entry in entries.to_dict('records'))
+    converted = pd.Series(schemas).value_counts()
+    for schema, n in converted.items():
+        logger.info('{} {} files converted.'.format(n, schema))
+    print('{} files converted to {} in {}.'.format(converted.sum(), args.format, out_dir))
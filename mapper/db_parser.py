@@ -1,11 +1,107 @@
 # coding: utf-8
-import glob
+import numpy as np
 import pandas as pd
+import io
 import os
+from .columnar import read_columnar
+from .manifest import load_manifest, separators
+from .packed import packed_view
 #import dask.dataframe as dd
 
+# column types of the structural database
+structural_dtypes = {'Protein_accession': str, 'Protein_length': np.int32,
+                     'Protein_position': np.int32, 'PDB_code': 'category',
+                     'PDB_chain': 'category', 'PDB_chain_length': np.int32,
+                     'PDB_3D_position': np.int32, 'PDB_seq_position': np.int32,
+                     'Evalue': np.float64, 'Pident': np.float64,
+                     'Interaction_type': 'category',
+                     'PDB_interacting_chain': 'category',
+                     'PDB_interacting_3D_position': str,
+                     'PDB_B_factor': np.float64,
+                     'PDB_interacting_B_factor': np.float64,
+                     'Protein_alignment_start': np.int32,
+                     'Protein_alignment_end': np.int32,
+                     'PDB_alignment_start': np.int32,
+                     'PDB_alignment_end': np.int32,
+                     'Structure_feature_id': 'category'}
 
-def parser(prot_id, db_dir):
+# column types of the variants database. Columns with few distinct values
+# are dictionary-encoded, as they are repeated in every joined row
+variants_dtypes = {'Uploaded_variation': str, 'Location': str,
+                   'Allele': 'category', 'Gene': 'category',
+                   'Feature': 'category', 'Feature_type': 'category',
+                   'Protein_position': str, 'Amino_acids': 'category',
+                   'Consequence': 'category', 'Existing_variation': str,
+                   'Is_coding': np.int8, 'Consequence_mask': np.int64}
+
+# columns needed to map positions when only the setID file is written
+structural_columns = ['Protein_accession', 'Protein_position', 'Evalue',
+                      'Pident', 'Interaction_type', 'Protein_alignment_start',
+                      'Protein_alignment_end', 'Structure_feature_id']
+variants_columns = ['Uploaded_variation', 'Existing_variation',
+                    'Protein_position', 'Amino_acids', 'Consequence',
+                    'Is_coding', 'Consequence_mask']
+
+
+def projection(csv=False, hdf=False):
+    '''
+    Columns of the variants and structural databases needed for the
+    requested outputs, None if every column is written.
+    '''
+    if csv or hdf:
+        return None, None
+    return variants_columns, structural_columns
+
+
+def detect_schema(columns):
+    '''
+    Database a file belongs to from its columns: 'structural', 'variants'
+    or None if it is not a database file.
+    '''
+    if 'Pident' in columns:
+        return 'structural'
+    if 'Uploaded_variation' in columns and 'Protein_position' in columns:
+        return 'variants'
+    return None
+
+
+def read_entry(path, entry, columns=None, dtype=None, nrows=None):
+    '''
+    Read a file of a database described by its manifest entry.
+
+    Parameters
+    ----------
+    path : str
+        File holding the entry, a data file if it is packed.
+    entry : dict
+        Manifest entry.
+    columns : list
+        columns to read, all of them if None
+    dtype : dict
+        type of the columns
+    nrows : int
+        number of rows to read, all of them if None
+
+    Returns
+    -------
+    df
+        parsed file
+    '''
+    if entry['offset'] >= 0:
+        path = packed_view(path, int(entry['offset']), int(entry['size']))
+    if entry['format'] != 'text':
+        df = read_columnar(path, entry['format'], columns)
+        return df if nrows is None else df.head(nrows)
+    if not isinstance(path, str):
+        path = io.BytesIO(path)
+    return pd.read_csv(path,
+                       sep=separators[entry['delimiter']], engine='c',
+                       compression=None if entry['compression'] == 'none' else entry['compression'],
+                       usecols=None if columns is None else (lambda c: c in columns),
+                       dtype=dtype, nrows=nrows)
+
+
+def parser(prot_id, db_dir, columns=None, dtype=None):
     '''
     Parse input and detect whether is a VCF or VEP file. Any other format
     is invalid. 
@@ -16,6 +112,10 @@ def parser(prot_id, db_dir):
         protein id 
     db_dir : str
         directory where to find the database to parse
+    columns : list
+        columns to read, all of them if None
+    dtype : dict
+        type of the columns
 
     Returns
     -------
@@ -23,21 +123,9 @@ def parser(prot_id, db_dir):
         parsed file
     '''
 
-    f = glob.glob(os.path.join(db_dir, (prot_id + '.*')))
+    manifest = load_manifest(db_dir)
+    entry = manifest.get(prot_id)
 
-    if not f:
+    if entry is None:
         raise IOError()
-    else:
-        try:
-            if '.gz' in f: 
-               df = pd.read_csv(f[0], sep="\t", engine='c', compression='gzip',
-                   error_bad_lines=False)
-            else: 
-                df = pd.read_csv(f[0], sep="\t", engine='c')
-        except:
-            if '.gz' in f:
-                df = pd.read_csv(f[0], sep=" ", engine='c',compression='gzip',
-                   error_bad_lines=False)
-            else: 
-                df = pd.read_csv(f[0], sep=" ", engine='c')
-        return df
+    return read_entry(manifest.filepath(entry), entry, columns, dtype)
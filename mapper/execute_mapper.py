@@ -1,14 +1,19 @@
 # coding: utf-8
 
 # Import necesary modules
-from .stats import stats
-from .mapper_wrapper import wrapper
+from .stats import stats, peak_rss
+from .batch import chunk_tasks
+from .pool import map_batch, map_units, run_pool, unit_key
+from .journal import Journal, fingerprint, read_journal, rollback
+from .writer import OutputWriter
+from .planner import pack_units, plan, shard_assignment, task_costs
 from .run_subprocess import call_subprocess
 from .input_isfile import isfile
 from .logger import get_logger
 from .decorator import tags
 from .mapper import mapper
-from .translate import translate
+from .translate import translate, translate_many
+from .var_index import load_variant_index, read_varids
 from .parse_argv import parse_commandline
 import sys
 import os
@@ -107,7 +112,7 @@ def out_file(out_dir, spinner):
 def dest_results(spinner, logger):
     args = parse_commandline()
     if args.force is True:
-        fileList = glob.glob(os.path.join(args.out, 'setID*.txt'))
+        fileList = glob.glob(os.path.join(args.out, 'setID*.txt*'))
         # Iterate over the list of filepaths & remove each file.
         for filePath in fileList:
             try:
@@ -115,16 +120,20 @@ def dest_results(spinner, logger):
             except:
                 pass
         for item in os.listdir(args.out):
-            if item in ['hdf5', 'csv']:
+            if item in ['hdf5', 'csv', 'parquet']:
                 shutil.rmtree(os.path.join(args.out, item))
 
     elif args.append is True:
         spinner.info(
                 text=' Directory ' + args.out + ' is not empty. Appending files. ')
+
+    elif args.resume is True:
+        spinner.info(
+                text=' Resuming the run in ' + args.out + '. ')
         
     else:
         for item in os.listdir(args.out):
-            if item in ['hdf5', 'csv']:
+            if item in ['hdf5', 'csv', 'parquet']:
                 logger.warning(
                     'Directory ' + args.out + ' is not empty. Not overwritting files. ' +
                     'Please select option --force or --append or specify a different output dir.')
@@ -163,14 +172,140 @@ def report(out, time_format):
 
 def parallel(parallel, njobs): 
     if parallel is True:
-        if njobs != 1:
+        if njobs not in (None, 1):
             num_cores = int(njobs)
         else:
-            num_cores = mp.cpu_count()-1
+            num_cores = max(mp.cpu_count()-1, 1)
     else:
         num_cores = njobs
     return(num_cores)
 
+def pair_units(tasks, cols, varids=None):
+    # one unit per transcript and protein, and its cost
+    units = [(row[0], None if varids is None else varids[row[0]],
+              {c: [v] for c, v in zip(cols, row[1:])})
+             for row in tasks[['inputID'] + cols].itertuples(index=False)]
+    return units, tasks['cost'].tolist()
+
+def unit_groups(units):
+    # units of the same protein go to the same worker, where its parsed
+    # structural data is cached
+    return [('protein', ids['protID'][0]) if ids else ('id', id) for id, varid, ids in units]
+
+def pending(units, costs, done):
+    # units not completed by the run being resumed
+    keep = [i for i, u in enumerate(units) if unit_key(u) not in done]
+    return [units[i] for i in keep], [costs[i] for i in keep]
+
+def pending_tasks(tasks, done):
+    # batch tasks not completed by the run being resumed
+    keys = zip(tasks['inputID'], tasks['transcriptID'], tasks['protID'])
+    return tasks[[k not in done for k in keys]]
+
+def select_shard(tasks, located, shard):
+    # proteins (with all their transcripts) and ids only located that
+    # belong to shard i of N
+    i, n = shard
+    costs = tasks.groupby('protID', sort=False)['cost'].sum()
+    keys = [('protein', p) for p in costs.index] + [('id', u) for u in located]
+    assignment = shard_assignment(keys, costs.tolist() + [1] * len(located), n)
+    tasks = tasks[[assignment[('protein', p)] == i for p in tasks['protID']]]
+    return tasks, [u for u in located if assignment[('id', u)] == i]
+
+def show_plan(tasks, report, logger):
+    # expected rows, bytes and peak memory of each protein, without mapping
+    table = tabulate(plan(tasks), headers='keys', showindex=False, floatfmt='.1f')
+    logger.info('Mapping plan:\n' + table)
+    report.write(table + '\n')
+    print(table)
+
+def usage_report(stats, report, logger):
+    # sum the frame cache counters of every call and report the
+    # peak memory of the workers and of the main process
+    stats = pd.DataFrame([s for s in stats if s is not None])
+    maptools = MapTools()
+    if 'hits' in stats.columns:
+        total = stats[['hits', 'misses', 'evictions']].sum()
+        calls = total['hits'] + total['misses']
+        maptools.log('Structural data cache: {} hits, {} misses, {} evictions ({:.1%} hit rate).'.format(
+            total['hits'], total['misses'], total['evictions'],
+            total['hits'] / calls if calls else 0), report, logger)
+    maptools.log('Peak RSS: {:.1f} MB (main process), {:.1f} MB (largest worker).'.format(
+        peak_rss(), stats['peak_rss'].max() if 'peak_rss' in stats.columns else 0),
+        report, logger)
+
+
+def open_outputs(args, index_file, cache_size, report, logger, spinner, time_format):
+    # journal of the completed units, to resume the run if interrupted
+    maptools = MapTools()
+    run_fingerprint = fingerprint(args)
+    done = set()
+    if args.resume:
+        previous = read_journal(args.out)
+        if previous is None or previous['fingerprints'] != {run_fingerprint}:
+            logger.error('The run in ' + args.out + ' cannot be resumed: no journal or different options.')
+            spinner.fail(' Running 3Dmapper...failed!')
+            report.write(time_format + ' Running 3Dmapper...failed!')
+            raise IOError
+        done = previous['units']
+        maptools.log('Resuming: {} units already mapped, {} bytes or files of unfinished units removed.'.format(
+            len(done), rollback(previous)), report, logger)
+    journal = Journal(args.out, run_fingerprint, resume=args.resume)
+    # every worker sends its results to a single writer
+    writer = OutputWriter(partition_by=args.partition_by, compression=args.compress,
+                          level=args.compress_level, threads=args.compress_threads,
+                          journal=journal)
+    # options of the run, given once to every worker of the pool
+    state = {'psdb': args.psdb, 'vardb': args.vardb, 'out_dir': args.out,
+             'pident': args.pident, 'evalue': args.evalue, 'isoform': args.isoform,
+             'consequence': args.consequence, 'loc': args.loc, 'index_file': index_file,
+             'dict_geneprot': args.dict_geneprot, 'csv': args.csv, 'hdf': args.hdf,
+             'parquet': args.parquet, 'cache_size': cache_size, 'queue': writer.queue}
+    return done, writer, state
+
+def run_tasks(args, tasks, located, varids, index_file, cache_size, num_cores,
+              report, logger, spinner, time_format, start):
+    # shared by -vid and -pid runs once their ids are resolved: estimate
+    # the cost of the translated tasks, keep those of the shard and map
+    # them (or show the plan) with the ids only located
+    maptools = MapTools()
+    cols = ['geneID', 'transcriptID', 'protID']
+    if args.isoform is not None:
+        cols.append('APPRIS')
+    # cost of mapping each transcript from the database manifests
+    tasks = task_costs(tasks, args.psdb, args.vardb)
+    if args.shard is not None:
+        tasks, located = select_shard(tasks, located, args.shard)
+        maptools.log('Shard {}/{}: {} transcripts.'.format(
+            *args.shard, len(tasks) + len(located)), report, logger)
+    if args.plan:
+        show_plan(tasks, report, logger)
+        return
+    done, writer, state = open_outputs(args, index_file, cache_size, report, logger,
+                                       spinner, time_format)
+    if args.batch:
+        tasks = pending_tasks(tasks, done)
+        chunks = chunk_tasks(tasks, args.batch_memory * 1024 ** 2)
+        logger.info('{} transcripts split in {} batches of at most {} MB.'.format(
+            len(tasks), len(chunks), args.batch_memory))
+        jobs = [(map_batch, chunks)]
+        units, costs = [], []
+    else:
+        jobs = []
+        units, costs = pair_units(tasks, cols, varids)
+    # ids without translation are only located in the variants db
+    units.extend((i, None if varids is None else varids[i], {}) for i in located)
+    costs.extend(1 for i in located)
+    units, costs = pending(units, costs, done)
+    # pairs packed into batches of similar cost by protein, largest first
+    jobs.append((map_units, pack_units(units, costs, num_cores, unit_groups(units))))
+    stats = run_pool(jobs, state, num_cores, writer)
+    written = writer.close()
+    logger.info('{:.1f} MB written to {} output files.'.format(
+        sum(written.values()) / 1024 ** 2, len(written)))
+    usage_report(stats, report, logger)
+    finish_message(logger, report, time_format, start, spinner)
+
 def start_spinner(verbose, logger, time_format, spinner):
     start = time.time()
     logger.info('Running 3Dmapper...')
@@ -198,10 +333,13 @@ def main():
     # time message
     time_format = '[' + time.ctime(time.time()) + '] '
 
-    dest_results(spinner, logger)
+    # a plan leaves the outputs untouched
+    if not args.plan:
+        dest_results(spinner, logger)
 
-    result_format(args.hdf, args.out, 'hdf5', spinner, logger)
-    result_format(args.csv, args.out, 'csv', spinner, logger)
+        result_format(args.hdf, args.out, 'hdf5', spinner, logger)
+        result_format(args.csv, args.out, 'csv', spinner, logger)
+        result_format(args.parquet, args.out, 'parquet', spinner, logger)
 
     # set up the results report
     report = open(os.path.join(args.out, '3dmapper.report'), 'a')
@@ -222,82 +360,38 @@ def main():
     num_cores  = parallel(args.parallel, args.njobs)
     # find variants index file created with makevariantsdb
     index_file = glob.glob(os.path.join(args.vardb, '*.index'))[0]
+    # memory of the structural data cache of each job
+    cache_size = args.cache_size * 1024 ** 2
     
 
     start= start_spinner(args.verbose, logger, time_format, spinner)
     if args.varid:
         # find positions index file
         for ids in args.varid:
-            # run PDBmapper
-            if isfile(ids) == 'yes':
-                input = 'file'
-                with open(ids) as list_varids:
-                    for id in list_varids:
-                        # remove \n from the end
-                        id = id.replace('\n', '')
-                        # grep position in index file created with makepositionsdb
-                        cmd = ('grep \'\\b{}\\b\' {}').format(id, index_file)
-                        out, err = call_subprocess(cmd)
-                        if err is None and out != b'':
-                            toprocess = out.decode('utf-8')
-                            transcriptid = [toprocess[2].strip()]
-
-                            Parallel(n_jobs=num_cores)(delayed(wrapper)(t,
-                                                                        args.psdb,
-                                                                        args.vardb,
-                                                                        args.out,
-                                                                        args.pident,
-                                                                        args.evalue,
-                                                                        args.isoform,
-                                                                        args.consequence,
-                                                                        args.loc,
-                                                                        index_file,
-                                                                        args.dict_geneprot,
-                                                                        #args.uniprot,
-                                                                        id,
-                                                                        args.csv,
-                                                                        args.hdf)
-                                                       for t in transcriptid)
-                        else:
-                            logger.error(
-                                'Wrong input: {} is not a recognizable position id'.format(id))
-                            continue
-
-            elif isfile(ids) == "no":
-                cmd = ('grep \'\\b{}\\b\' {}').format(ids, index_file)
-                # call subprocess
-                out, err = call_subprocess(cmd)
-                if err is None and out != b'':
-                    toprocess = out.decode('utf-8').split(" ")
-                    transcriptid = [toprocess[2].strip()]
-                    Parallel(n_jobs=num_cores)(delayed(wrapper)(t,
-                                                                args.psdb,
-                                                                args.vardb,
-                                                                args.out,
-                                                                args.pident,
-                                                                args.evalue,
-                                                                args.isoform,
-                                                                args.consequence,
-                                                                args.loc,
-                                                                index_file,
-                                                                args.dict_geneprot,
-                                                               # args.uniprot,
-                                                                ids,
-                                                                args.csv,
-                                                                args.hdf)
-                                               for t in transcriptid)
-                else:
-                    logger.error(
-                        'Wrong input: {} is not a recognizable position id'.format(ids))
-                    continue
-
-            else:
+            if isfile(ids) == "not_recognized":
                 logger.error(
                     'The input positions ids provided are not in a valid format.')
                 spinner.fail(" Running 3Dmapper...failed!")
                 report.write(time_format + " Running 3Dmapper...failed!")
                 raise IOError
-            finish_message(logger, report, time_format, start, spinner)
+        # resolve the whole list of positions in the sorted index
+        # file created with makevariantsdb
+        varids = read_varids(args.varid)
+        located, unresolved = load_variant_index(
+            args.vardb, index_file).resolve(varids)
+        if unresolved:
+            maptools.log('{} input positions are not recognizable position ids: {}'.format(
+                len(unresolved), ', '.join(unresolved)), report, logger)
+        # every transcript hit by the positions is processed once,
+        # filtering all its selected positions at the same time
+        varids = {t: g['varID'].tolist()
+                  for t, g in located.groupby('Feature', sort=False)}
+        # translate every transcript at once
+        tasks, unresolved, filtered = translate_many(
+            list(varids), args.out, args.dict_geneprot, args.isoform)
+        tasks['varid'] = tasks['inputID'].map(varids)
+        run_tasks(args, tasks, unresolved + filtered if args.loc else [], varids, index_file,
+                  cache_size, num_cores, report, logger, spinner, time_format, start)
 
     if args.prot_id:
         # PDBmapper accepts single or multiple protein ids
@@ -305,32 +399,8 @@ def main():
         for ids in args.prot_id:
             # check if input is a file
             if isfile(ids) == "yes":
-                input = 'file'
-                with open(ids) as list_prot_ids:
-                    logger.info(
-                        'Input positions file contains a list of protein ids to process.')
-                    # for every ensembl id
-                    Parallel(n_jobs=num_cores)(delayed(wrapper)(prot_id.replace('\n', ''),
-                                                                args.psdb,
-                                                                args.vardb,
-                                                                args.out,
-                                                                args.pident,
-                                                                args.evalue,
-                                                                args.isoform,
-                                                                args.consequence,
-                                                                args.loc,
-                                                                index_file,
-                                                                args.dict_geneprot,
-                                                               # args.uniprot,
-                                                                None,
-                                                                args.csv,
-                                                                args.hdf)
-                                               for prot_id in list_prot_ids)
-
-            # given in command line
-            elif isfile(ids) == "no":
-                input = 'not_file'
-                break
+                logger.info(
+                    'Input positions file contains a list of protein ids to process.')
             elif isfile(ids) == "not_recognized":
                 maptools.log('The input is neither an id(s) or a file containing a list of ids.',
                              report, logger)
@@ -338,25 +408,14 @@ def main():
                     'The input is neither an id(s) or a file containing a list of ids.')
                 exit(-1)
 
-        # for prot id get the gene id
-        if input == 'not_file':
-            # print(args.prot_id)
-            Parallel(n_jobs=num_cores)(delayed(wrapper)(ids,
-                                                        args.psdb,
-                                                        args.vardb,
-                                                        args.out,
-                                                        args.pident,
-                                                        args.evalue,
-                                                        args.isoform,
-                                                        args.consequence,
-                                                        args.loc,
-                                                        index_file,
-                                                        args.dict_geneprot,
-                                                       # args.uniprot,
-                                                        None,
-                                                        args.csv,
-                                                        args.hdf)
-                                       for ids in args.prot_id)
-
-        # Compute execution time
-        finish_message(logger, report, time_format, start, spinner)
+        # resolve the whole set of ids up front
+        translated, unresolved, filtered = translate_many(
+            args.prot_id, args.out, args.dict_geneprot, args.isoform)
+        if unresolved:
+            maptools.log('{} input IDs have no matching ensembl ids: {}'.format(
+                len(unresolved), ', '.join(unresolved)), report, logger)
+        if filtered:
+            maptools.log('{} input IDs have no isoform in {}: {}'.format(
+                len(filtered), ', '.join(args.isoform), ', '.join(filtered)), report, logger)
+        run_tasks(args, translated, unresolved + filtered if args.loc else [], None, index_file,
+                  cache_size, num_cores, report, logger, spinner, time_format, start)
@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+import pandas as pd
+
+
+def expand_ranges(df, column='Protein_position'):
+    '''
+    Spread positions given as a range (e.g. '120-135' for frameshifts and
+    indels) into one row per position and type the positions as integers.
+    An unknown endpoint ('?-88' or '120-?') is replaced by the other one.
+
+    Parameters
+    ----------
+    df : df
+        Variants of a transcript.
+    column : str
+        Column with the positions.
+
+    Returns
+    -------
+    df
+        Rows without a range followed by one row per position of each
+        range. Positions are a nullable integer column (Int32), NA for
+        those that are not a number (e.g. '-' of noncoding variants).
+    '''
+    bounds = df[column].astype(str).str.extract(r'^([0-9]+|\?)-([0-9]+|\?)$')
+    ranged = (bounds[0].notna() & ~((bounds[0] == '?') & (bounds[1] == '?'))).to_numpy()
+    positions = pd.to_numeric(df[column], errors='coerce').astype('Int32')
+    df = df.copy(deep=False)
+    df[column] = positions
+    if not ranged.any():
+        return df
+    start, end = bounds.loc[ranged, 0], bounds.loc[ranged, 1]
+    start, end = start.where(start != '?', end), end.where(end != '?', start)
+    start = start.astype(np.int64).to_numpy()
+    end = end.astype(np.int64).to_numpy()
+    # empty ranges (end before start) are dropped
+    lengths = np.maximum(end - start + 1, 0)
+    offsets = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    expanded = df.iloc[np.repeat(np.flatnonzero(ranged), lengths)].copy()
+    expanded[column] = pd.array(np.repeat(start, lengths) + offsets, dtype='Int32')
+    return pd.concat([df.loc[~ranged], expanded], sort=False).reset_index(drop=True)
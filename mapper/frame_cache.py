@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+
+# import necessary modules
+from collections import OrderedDict
+
+# frame cache of this process
+_frame_cache = None
+
+
+class FrameCache:
+    '''
+    Least recently used cache of parsed data frames bounded by their size
+    in memory.
+
+    Several transcripts of a gene usually map to the same protein, so the
+    parsed and filtered structural data of a protein is kept to be reused
+    by the next transcripts processed by the same worker.
+    '''
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.frames = OrderedDict()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        '''
+        Cached frame of a key, None if it is not cached.
+        '''
+        if key not in self.frames:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.frames.move_to_end(key)
+        return self.frames[key][0]
+
+    def put(self, key, df):
+        '''
+        Cache a frame, evicting the least recently used ones if needed.
+        Frames larger than the whole cache are not cached.
+        '''
+        size = int(df.memory_usage(index=True, deep=True).sum())
+        if size > self.max_bytes:
+            return
+        if key in self.frames:
+            self.nbytes -= self.frames.pop(key)[1]
+        while self.frames and self.nbytes + size > self.max_bytes:
+            self.nbytes -= self.frames.popitem(last=False)[1][1]
+            self.evictions += 1
+        self.frames[key] = (df, size)
+        self.nbytes += size
+
+    def counters(self):
+        '''
+        Hits, misses and evictions so far.
+        '''
+        return {'hits': self.hits, 'misses': self.misses,
+                'evictions': self.evictions}
+
+
+def get_frame_cache(max_bytes):
+    '''
+    Frame cache of this process, created on first use.
+
+    Parameters
+    ----------
+    max_bytes : int
+        Maximum size of the cached frames in bytes.
+
+    Returns
+    -------
+    FrameCache
+        Frame cache shared by every call in this process.
+    '''
+    global _frame_cache
+    if _frame_cache is None or _frame_cache.max_bytes != max_bytes:
+        _frame_cache = FrameCache(max_bytes)
+    return _frame_cache
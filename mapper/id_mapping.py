@@ -0,0 +1,254 @@
+# -*- coding: utf-8 -*-
+
+# import necessary modules
+import os
+import re
+import json
+import hashlib
+import tempfile
+import numpy as np
+import pandas as pd
+
+# ID mappings already loaded by this process, keyed by file path
+_id_mappings = {}
+
+# compiled ID mapping file layout
+MAGIC = b'3DMIDX01'
+VERSION = 1
+ALIGN = 64
+
+
+def file_hash(path):
+    '''
+    SHA-1 digest of a file.
+    '''
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def compile_id_mapping(dict_geneprot):
+    '''
+    Compile the ID mapping file into sorted key arrays.
+
+    Every gene, transcript and protein ID is a key, as well as each of its
+    words (e.g. 'P09769' for 'sp|P09769|FGR_HUMAN'), so that a lookup
+    matches the same rows as ``grep -w`` over the mapping file.
+
+    Parameters
+    ----------
+    dict_geneprot : str
+        Path to the ID mapping file.
+
+    Returns
+    -------
+    dict
+        Arrays of sorted keys ('keys'), the row of each key ('rows') and one
+        array per column of the mapping file ('col_<name>').
+    list
+        Column names of the mapping file.
+    '''
+    df = pd.read_csv(dict_geneprot, sep=',', dtype=str, keep_default_na=False)
+    keys, rows = [], []
+    for row, values in enumerate(
+            df[[c for c in IDMapping.id_columns if c in df.columns]].values):
+        row_keys = set()
+        for value in values:
+            row_keys.add(value)
+            row_keys.update(re.split(r'\W+', value))
+        row_keys.discard('')
+        keys.extend(row_keys)
+        rows.extend([row] * len(row_keys))
+    keys = np.array([k.encode('utf-8') for k in keys], dtype=bytes)
+    rows = np.array(rows, dtype=np.int32)
+    # sort by key, then by row to keep the order of the mapping file
+    order = np.lexsort((rows, keys))
+    arrays = {'keys': keys[order], 'rows': rows[order]}
+    for c in df.columns:
+        arrays['col_' + c] = np.array(
+            [v.encode('utf-8') for v in df[c]], dtype=bytes)
+    return arrays, df.columns.tolist()
+
+
+def write_compiled(path, arrays, header):
+    '''
+    Write arrays to a single memory-mappable file, atomically.
+    '''
+    header = dict(header, arrays={})
+    offset = 0
+    for name, a in arrays.items():
+        header['arrays'][name] = {'dtype': a.dtype.str, 'shape': list(a.shape),
+                                  'offset': offset}
+        offset += -(-a.nbytes // ALIGN) * ALIGN
+    meta = json.dumps(header).encode('utf-8')
+    start = -(-(len(MAGIC) + 8 + len(meta)) // ALIGN) * ALIGN
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path) or '.',
+                               prefix=os.path.basename(path) + '.')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(MAGIC + start.to_bytes(8, 'little') + meta)
+            for name, a in arrays.items():
+                f.seek(start + header['arrays'][name]['offset'])
+                f.write(a.tobytes())
+        os.chmod(tmp, 0o644)
+        os.replace(tmp, path)
+    except BaseException:
+        os.remove(tmp)
+        raise
+
+
+def read_compiled_header(path):
+    '''
+    Read the header of a compiled file, None if it is not valid.
+    '''
+    try:
+        with open(path, 'rb') as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                return None
+            start = int.from_bytes(f.read(8), 'little')
+            meta = f.read(start - len(MAGIC) - 8).rstrip(b'\0')
+        header = json.loads(meta.decode('utf-8'))
+        header['start'] = start
+        return header
+    except (OSError, ValueError):
+        return None
+
+
+def map_compiled(path, header):
+    '''
+    Memory-map the arrays of a compiled file.
+    '''
+    arrays = {}
+    for name, a in header['arrays'].items():
+        if a['shape'][0] == 0:
+            arrays[name] = np.empty(a['shape'], dtype=a['dtype'])
+        else:
+            arrays[name] = np.memmap(path, dtype=a['dtype'], mode='r',
+                                     offset=header['start'] + a['offset'],
+                                     shape=tuple(a['shape']))
+    return arrays
+
+
+class IDMapping:
+    '''
+    Binary-searchable index of the gene-transcript-protein ID mapping file.
+
+    The index is compiled once into ``<dict_geneprot>.idx`` next to the
+    mapping file and memory-mapped afterwards. It is rebuilt when the size,
+    modification time or content of the mapping file changes.
+    '''
+
+    id_columns = ['geneID', 'transcriptID', 'protID']
+
+    def __init__(self, dict_geneprot):
+        self.path = dict_geneprot
+        self.cache = dict_geneprot + '.idx'
+        st = os.stat(dict_geneprot)
+        source = {'version': VERSION, 'size': st.st_size,
+                  'mtime_ns': st.st_mtime_ns}
+        header = read_compiled_header(self.cache)
+        if header is not None and header.get('version') == VERSION and (
+                header['size'], header['mtime_ns']) != (st.st_size, st.st_mtime_ns):
+            # file touched or copied, reuse the index if the content is the same
+            source['sha1'] = file_hash(dict_geneprot)
+            if header.get('sha1') == source['sha1']:
+                header = self.update_header(header, source)
+            else:
+                header = None
+        if header is not None and header.get('version') == VERSION:
+            self.columns = header['columns']
+            self.arrays = map_compiled(self.cache, header)
+        else:
+            self.arrays, self.columns = compile_id_mapping(dict_geneprot)
+            source.setdefault('sha1', file_hash(dict_geneprot))
+            try:
+                write_compiled(self.cache, self.arrays,
+                               dict(source, columns=self.columns))
+            except OSError:
+                # read-only location, keep the index in memory
+                pass
+        self.keys, self.rows = self.arrays['keys'], self.arrays['rows']
+
+    def update_header(self, header, source):
+        '''
+        Record the new size and modification time of an unchanged mapping file.
+        '''
+        arrays = map_compiled(self.cache, header)
+        try:
+            write_compiled(self.cache, {k: np.asarray(v) for k, v in arrays.items()},
+                           dict(source, columns=header['columns']))
+            return read_compiled_header(self.cache)
+        except OSError:
+            return header
+
+    def frame(self, rows):
+        '''
+        Rows of the mapping file as a data frame of str.
+        '''
+        return pd.DataFrame({c: np.char.decode(np.asarray(self.arrays['col_' + c])[rows], 'utf-8')
+                             for c in self.columns})
+
+    def lookup_many(self, ids):
+        '''
+        Binary search of many IDs at once.
+
+        Parameters
+        ----------
+        ids : list
+            Input IDs corresponding to genes, transcripts or proteins.
+
+        Returns
+        -------
+        array
+            Position in ``ids`` of every match.
+        array
+            Row of the mapping file of every match.
+        '''
+        ids = np.array([str(i).encode('utf-8') for i in ids], dtype=bytes)
+        if len(ids) == 0 or len(self.keys) == 0:
+            return np.array([], dtype=np.intp), np.array([], dtype=np.int32)
+        lo = np.searchsorted(self.keys, ids, side='left')
+        hi = np.searchsorted(self.keys, ids, side='right')
+        counts = hi - lo
+        matches = np.repeat(np.arange(len(ids)), counts)
+        # position of every match in the sorted key array
+        offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        return matches, np.asarray(self.rows[np.repeat(lo, counts) + offsets])
+
+    def lookup(self, id):
+        '''
+        Rows of the mapping file matching the input ID.
+
+        Parameters
+        ----------
+        id : str
+            Input ID corresponding to a gene, transcript or protein.
+
+        Returns
+        -------
+        df
+            Matching rows, empty if the ID is unknown.
+        '''
+        return self.frame(self.lookup_many([id])[1])
+
+
+def load_id_mapping(dict_geneprot):
+    '''
+    Load the ID mapping file once per process.
+
+    Parameters
+    ----------
+    dict_geneprot : str
+        Path to the ID mapping file.
+
+    Returns
+    -------
+    IDMapping
+        Indexed ID mapping.
+    '''
+    path = os.path.abspath(dict_geneprot)
+    if path not in _id_mappings:
+        _id_mappings[path] = IDMapping(dict_geneprot)
+    return _id_mappings[path]
@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+
+
+def covered(positions, starts, ends):
+    '''
+    Whether each position falls within any of the intervals [start, end].
+
+    Intervals are sorted by start and the running maximum of their ends
+    is kept, so a position is covered if the last interval starting at or
+    before it reaches it. Each position is answered with one binary search.
+
+    Parameters
+    ----------
+    positions : array
+        Positions to look up.
+    starts : array
+        Start of each interval.
+    ends : array
+        End of each interval (included).
+
+    Returns
+    -------
+    array
+        Boolean mask over positions.
+    '''
+    positions = np.asarray(positions)
+    order = np.argsort(starts, kind='mergesort')
+    starts = np.asarray(starts)[order]
+    reach = np.maximum.accumulate(np.asarray(ends)[order]) if len(order) else order
+    last = np.searchsorted(starts, positions, side='right') - 1
+    mask = last >= 0
+    mask[mask] = reach[last[mask]] >= positions[mask]
+    return mask
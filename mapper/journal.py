@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+
+# import necessary modules
+import os
+import json
+import hashlib
+
+# journal of completed work units written in the output directory
+JOURNAL = '.3dmapper.journal'
+
+# options that change the content of the outputs
+fingerprint_options = ['psdb', 'vardb', 'dict_geneprot', 'pident', 'evalue', 'isoform',
+                       'consequence', 'loc', 'csv', 'hdf', 'parquet', 'partition_by',
+                       'compress', 'shard']
+
+
+def fingerprint(args):
+    '''
+    Fingerprint of the options of a run that change its outputs, so that
+    a run is only resumed with the same ones.
+    '''
+    options = {o: getattr(args, o, None) for o in fingerprint_options}
+    for o in ['psdb', 'vardb', 'dict_geneprot']:
+        if options[o] is not None:
+            options[o] = os.path.abspath(options[o])
+    return hashlib.sha1(json.dumps(options, sort_keys=True, default=str).encode()).hexdigest()
+
+
+class Journal:
+    '''
+    Journal of a run, one JSON record per line, appended and synced to
+    disk by the output writer around every write of the outputs:
+
+    - start: fingerprint of the options and token naming the Parquet
+      files of the writer.
+    - begin: size of every csv output and Parquet datasets before a write.
+    - commit: size of every csv output after the write, work units whose
+      rows it completed and Parquet files it created.
+
+    The last record always describes consistent outputs: the sizes before
+    a write that did not finish, or after the last one that did.
+    '''
+
+    def __init__(self, out_dir, fingerprint, resume=False):
+        self.path = os.path.join(out_dir, JOURNAL)
+        self.fingerprint = fingerprint
+        self.file = open(self.path, 'a' if resume else 'w')
+
+    def write(self, record):
+        self.file.write(json.dumps(record) + '\n')
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def start(self, token):
+        self.write({'type': 'start', 'fingerprint': self.fingerprint, 'token': token})
+
+    def close(self):
+        self.file.close()
+
+
+def read_journal(out_dir):
+    '''
+    Read the journal of a previous run.
+
+    Parameters
+    ----------
+    out_dir : str
+        Output directory of the run.
+
+    Returns
+    -------
+    dict
+        Fingerprints and writer tokens of the run, sizes of the csv
+        outputs at the last consistent point ('offsets'), Parquet datasets,
+        committed Parquet files and completed units. None if there is no
+        journal.
+    '''
+    path = os.path.join(out_dir, JOURNAL)
+    if not os.path.exists(path):
+        return None
+    state = {'fingerprints': set(), 'tokens': [], 'offsets': {}, 'datasets': set(),
+             'parquet': set(), 'units': set()}
+    with open(path) as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # last record cut by the interruption
+                continue
+            if record['type'] == 'start':
+                state['fingerprints'].add(record['fingerprint'])
+                state['tokens'].append(record['token'])
+                continue
+            state['offsets'].update(record['offsets'])
+            state['datasets'].update(record.get('datasets', []))
+            state['parquet'].update(record.get('parquet', []))
+            state['units'].update(tuple(u) for u in record.get('units', []))
+    return state
+
+
+def rollback(state):
+    '''
+    Bring the outputs of an interrupted run back to its last consistent
+    point: truncate csv outputs to their recorded size and remove the
+    Parquet files of the run that were not committed.
+
+    Parameters
+    ----------
+    state : dict
+        Journal read by read_journal.
+
+    Returns
+    -------
+    int
+        Bytes and files removed.
+    '''
+    removed = 0
+    for path, size in state['offsets'].items():
+        if os.path.exists(path) and os.path.getsize(path) > size:
+            removed += os.path.getsize(path) - size
+            os.truncate(path, size)
+    prefixes = tuple('part-' + t + '-' for t in state['tokens'])
+    for dataset in state['datasets']:
+        for root, dirs, files in os.walk(dataset):
+            for f in files:
+                path = os.path.join(root, f)
+                if f.startswith(prefixes) and path not in state['parquet']:
+                    os.remove(path)
+                    removed += 1
+    return removed
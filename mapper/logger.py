@@ -3,11 +3,18 @@ import time
 import logging
 import os
 
+# whether the log file of this process is configured
+_configured = False
+
 def get_logger(name, out_dir):
-    log_format = '[' + '%(asctime)s' + ']' + \
-        '%(name)8s -  %(message)s'
-    logging.basicConfig(level=logging.DEBUG,
-                        format=log_format,
-                        filename=os.path.join(out_dir, '3dmapper.log'),
-                        filemode='a')
+    # the log file is configured once per process, the first time
+    global _configured
+    if not _configured:
+        log_format = '[' + '%(asctime)s' + ']' + \
+            '%(name)8s -  %(message)s'
+        logging.basicConfig(level=logging.DEBUG,
+                            format=log_format,
+                            filename=os.path.join(out_dir, '3dmapper.log'),
+                            filemode='a')
+        _configured = True
     return logging.getLogger(name)
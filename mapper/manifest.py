@@ -0,0 +1,277 @@
+# -*- coding: utf-8 -*-
+
+# import necessary modules
+import os
+import gzip
+import tempfile
+import pandas as pd
+from .columnar import detect_format, columnar_rows, columnar_sources
+from .packed import PACKED_DIR, PACKED_INDEX, read_pack_index
+
+# manifests already loaded by this process, keyed by database directory
+_manifests = {}
+
+# manifest file written in every database directory
+MANIFEST = '.3dmapper.manifest'
+VERSION = 6
+
+# columns of the manifest
+manifest_columns = ['id', 'name', 'file', 'offset', 'size', 'mtime_ns', 'format',
+                    'compression', 'delimiter', 'rows', 'sources']
+
+# field separator of every delimiter of the manifest
+separators = {'tab': '\t', 'space': ' '}
+
+
+def describe(path):
+    '''
+    Format, compression, delimiter and number of rows of a database file.
+
+    Parameters
+    ----------
+    path : str
+        Path to a file of the variants or structural database.
+
+    Returns
+    -------
+    tuple
+        Format ('text', 'arrow' or 'parquet'), compression ('gzip' or
+        'none'), delimiter ('tab', 'space' or 'none') and number of rows
+        without the header, -1 for text files that are not database files
+        (e.g. variants.index), which are not read any further.
+    '''
+    from .db_parser import detect_schema
+    fmt = detect_format(path)
+    if fmt != 'text':
+        return fmt, 'none', 'none', columnar_rows(path, fmt)
+    with open(path, 'rb') as f:
+        compression = 'gzip' if f.read(2) == b'\x1f\x8b' else 'none'
+    opener = gzip.open if compression == 'gzip' else open
+    with opener(path, 'rb') as f:
+        header = f.readline()
+        delimiter = 'tab' if b'\t' in header else 'space'
+        columns = header.decode('utf-8', 'replace').rstrip('\r\n').split(separators[delimiter])
+        if detect_schema(columns) is None:
+            return fmt, compression, delimiter, -1
+        rows = sum(chunk.count(b'\n') for chunk in iter(lambda: f.read(1 << 20), b''))
+    return fmt, compression, delimiter, rows
+
+
+def describe_entry(path, st):
+    '''
+    Manifest row of a file of a database directory outside the pack, from
+    its path and stat result. None if the file cannot be read.
+    '''
+    name = os.path.basename(path)
+    try:
+        fmt, compression, delimiter, rows = describe(path)
+        sources = ','.join(sorted(columnar_sources(path, fmt))) if fmt != 'text' else ''
+    except (OSError, EOFError, ValueError, ImportError):
+        return None
+    return (name.split('.')[0], name, name, -1, st.st_size, st.st_mtime_ns,
+            fmt, compression, delimiter, rows, sources)
+
+
+def index_mtime(db_dir):
+    '''
+    Modification time of the pack index of a database directory, -1 if
+    it is not packed.
+    '''
+    try:
+        return os.stat(os.path.join(db_dir, PACKED_DIR, PACKED_INDEX)).st_mtime_ns
+    except OSError:
+        return -1
+
+
+def build_manifest(db_dir, previous=None):
+    '''
+    List the files of a database directory.
+
+    Parameters
+    ----------
+    db_dir : str
+        Directory of the variants or structural database.
+    previous : df
+        Manifest built before. Files with the size and modification time
+        it records, and the packed files if the pack index did not change,
+        are not read again.
+
+    Returns
+    -------
+    df
+        One row per file with its ID (file name up to the first dot), name,
+        file holding it, offset in that file (-1 unless it is packed), size,
+        modification time (of the pack index for packed files), format,
+        compression, delimiter, number of rows and, for columnar files, the
+        text files they were converted from (comma separated).
+    '''
+    known = {}
+    if previous is not None:
+        for row in previous[previous['offset'] < 0].itertuples(index=False):
+            known[(row.name, row.size, row.mtime_ns)] = row
+    entries = []
+    with os.scandir(db_dir) as it:
+        for e in it:
+            if e.name.startswith('.') or '.' not in e.name or not e.is_file():
+                continue
+            st = e.stat()
+            row = known.get((e.name, st.st_size, st.st_mtime_ns))
+            if row is None:
+                row = describe_entry(e.path, st)
+            if row is not None:
+                entries.append(tuple(row))
+    df = pd.DataFrame(entries, columns=manifest_columns)
+    # packed files, read again when the pack index changes
+    mtime = index_mtime(db_dir)
+    packed = None
+    if previous is not None and mtime >= 0:
+        packed = previous[(previous['offset'] >= 0) & (previous['mtime_ns'] == mtime)]
+        if not len(packed):
+            packed = None
+    if packed is None:
+        packed = read_pack_index(db_dir).rename(columns={'length': 'size'})
+        packed['mtime_ns'] = mtime
+    df = pd.concat([df, packed[manifest_columns]], ignore_index=True)
+    return df.sort_values(['file', 'offset']).reset_index(drop=True)
+
+
+class Manifest:
+    '''
+    Manifest of a variants or structural database directory.
+
+    It is cached in ``<db_dir>/.3dmapper.manifest``, with the modification
+    time of the pack index in its header. Once written, its own
+    modification time is set to that of the directory. While both are
+    unchanged, no file was added, removed or renamed and the pack was not
+    rebuilt, so the cache is used without listing the directory.
+    Otherwise the directory is listed and only the files whose size or
+    modification time changed, or that were added, are described again.
+
+    Files appended to or rewritten in place leave the directory unchanged,
+    so each entry is checked against its file the first time it is looked
+    up.
+    '''
+
+    def __init__(self, db_dir):
+        self.db_dir = db_dir
+        self.path = os.path.join(db_dir, MANIFEST)
+        self.listed = (os.stat(db_dir).st_mtime_ns, index_mtime(db_dir))
+        previous, cached = self.read()
+        if previous is not None and cached == self.listed:
+            self.df = previous
+        else:
+            self.df = build_manifest(db_dir, previous)
+            self.write()
+        self.checked = set()
+        # a file is found by any prefix of its name followed by a dot,
+        # as with glob('<id>.*'). Files outside the pack take precedence
+        # over packed files of the same ID, so that files added after
+        # packing are seen, and columnar files over text files. Text
+        # files kept after their conversion come last
+        converted = set((id, name) for id, sources in zip(self.df['id'], self.df['sources'])
+                        for name in sources.split(',') if name)
+        self.index = {}
+        for row in sorted(range(len(self.df)),
+                          key=lambda r: ((self.df['id'].iat[r], self.df['name'].iat[r]) in converted,
+                                         self.df['offset'].iat[r] >= 0,
+                                         self.df['format'].iat[r] == 'text')):
+            parts = self.df['name'].iat[row].split('.')
+            for i in range(1, len(parts)):
+                self.index.setdefault('.'.join(parts[:i]), row)
+
+    def read(self):
+        '''
+        Read the cached manifest and the modification times of the
+        directory and pack index it was written for. None if it is missing
+        or of another version.
+        '''
+        try:
+            with open(self.path) as f:
+                header = f.readline().lstrip('#').split()
+                if int(header[0]) != VERSION:
+                    return None, None
+                df = pd.read_csv(f, sep='\t',
+                                 dtype={'id': str, 'name': str, 'file': str, 'sources': str},
+                                 keep_default_na=False)
+                return df, (os.fstat(f.fileno()).st_mtime_ns, int(header[1]))
+        except (OSError, ValueError, IndexError):
+            return None, None
+
+    def write(self):
+        '''
+        Cache the manifest in the database directory. Its modification time
+        is set to that of the directory afterwards, unless the directory
+        changed since it was listed.
+        '''
+        try:
+            unchanged = os.stat(self.db_dir).st_mtime_ns == self.listed[0]
+            fd, tmp = tempfile.mkstemp(dir=self.db_dir, prefix=MANIFEST + '.')
+            with os.fdopen(fd, 'w') as f:
+                f.write('#{} {}\n'.format(VERSION, self.listed[1]))
+                self.df.to_csv(f, sep='\t', index=False)
+            os.chmod(tmp, 0o644)
+            os.replace(tmp, self.path)
+            if unchanged:
+                mtime = os.stat(self.db_dir).st_mtime_ns
+                os.utime(self.path, ns=(mtime, mtime))
+                self.listed = (mtime, self.listed[1])
+        except OSError:
+            # read-only database, keep the manifest in memory
+            pass
+
+    def check(self, row):
+        '''
+        Entry of a file outside the pack, described again if its size or
+        modification time changed. None if the file is gone.
+        '''
+        entry = self.df.iloc[row]
+        path = self.filepath(entry)
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        if (st.st_size, st.st_mtime_ns) != (entry['size'], entry['mtime_ns']):
+            described = describe_entry(path, st)
+            if described is None:
+                return None
+            self.df.iloc[row] = described
+            self.write()
+        self.checked.add(row)
+        return self.df.iloc[row]
+
+    def get(self, id):
+        '''
+        Manifest entry of an ID, None if the database has no file for it.
+        '''
+        row = self.index.get(id)
+        if row is None:
+            return None
+        if self.df['offset'].iat[row] < 0 and row not in self.checked:
+            return self.check(row)
+        return self.df.iloc[row]
+
+    def filepath(self, entry):
+        '''
+        Path to the file of a manifest entry.
+        '''
+        return os.path.join(self.db_dir, entry['file'])
+
+
+def load_manifest(db_dir):
+    '''
+    Load the manifest of a database directory once per process.
+
+    Parameters
+    ----------
+    db_dir : str
+        Directory of the variants or structural database.
+
+    Returns
+    -------
+    Manifest
+        Manifest of the database.
+    '''
+    path = os.path.abspath(db_dir)
+    if path not in _manifests:
+        _manifests[path] = Manifest(db_dir)
+    return _manifests[path]
@@ -9,14 +9,349 @@ import pandas as pd
 import numpy as np
 #import dask.dataframe as dd
 
-from .db_parser import parser
+from .consequences import coding_mask, select_consequences
+from .db_parser import parser, projection, structural_dtypes, variants_dtypes
 from .decorator import tags
 from .explode import explode
-from .explode2 import explode2
+from .interval_join import covered
+from .expand_ranges import expand_ranges
 from .logger import get_logger
+from .position_join import position_join
+from .select_positions import select_positions
 from .writefile import writefile
+from .writer import append_csv
 
-def mapper(prot_id,  gene_id, transcript_id, psdb, vardb, out_dir, pident, evalue, isoform, APPRIS, consequence, loc, var_id=None, csv=False, hdf=False):
+def mapping_position(df, label):
+    '''
+    Mapping_position column of a set of positions, dictionary-encoded.
+    '''
+    return pd.Categorical.from_codes(np.zeros(len(df), dtype=np.int8), categories=[label])
+
+
+def parse_structures(prot_id, psdb, pident, evalue, columns, logger):
+    '''
+    Parse the structural data of a protein and filter it by sequence
+    identity and evalue.
+
+    Parameters
+    ----------
+    prot_id : str
+        Protein ID
+    psdb : str
+        Directory where to find interface database
+    pident : int
+        Thershold of sequence identity (percertage).
+    evalue : float
+        Thershold of evalue.
+    columns : list
+        Columns to read, all of them if None.
+    logger : logger
+        Logger.
+
+    Returns
+    -------
+    df
+        Filtered structural data sorted by position. IOError is raised if
+        there is none.
+    '''
+    psdf = parser(prot_id, psdb, columns, structural_dtypes)
+
+    if 'Pident' not in list(psdf.columns):
+        logger.error(' Wrong structural data format. Header is missing')
+        raise IOError()
+    psdf = psdf.loc[psdf.Pident != 'Pident']
+    logger.info('Protein features file of ' + prot_id + ' parsed.')
+    # cols_stack
+    #cols_stack = psdf.apply(lambda x: x.astype(
+    #    str).str.match(r'[a-zA-Z0.-9]+/[a-zA-Z0.-9]+'))
+    #colsnames_stack = psdf.columns[cols_stack.any()].tolist()
+    # add column for chimera script
+    #if 'PDB_interacting_3D_position' in colsnames_stack:
+        #psdf['Interface_interacting_positions'] = psdf['PDB_interacting_position']  
+    #    psdf['Chimera_interacting_position'] = psdf['PDB_interacting_3D_position']
+    #if 'Evalue' in colsnames_stack:
+    #    colsnames_stack.remove('Evalue')
+    #if 'PDB_code' in colsnames_stack:
+    #    colsnames_stack.remove('PDB_code')
+    #if 'PDB_3D_position' in colsnames_stack:
+        #colsnames_stack.remove('PDB_3D_position')
+    #    psdf['Chimera_3D_position'] = psdf['PDB_3D_position']
+    #if 'Structure_feature_id' in colsnames_stack:
+    #    colsnames_stack.remove('Structure_feature_id')
+    #if any(colsnames_stack):
+    #    psdf = explode(psdf , colsnames_stack, '/')
+    #if any(columns_list):
+    #    psdf = explode(
+    #        psdf, columns_list, '/')
+    #else:
+    #    psdf[colsnames_stack] = \
+    #        psdf[colsnames_stack].astype(str)
+    # if default database is used minor modifications are needed
+    if pident is not None:
+        logger.info('Filtering interfaces by pident = ' +
+                    str(pident) + '%.')
+        # filter by pident
+        pident = float(pident)  # from str to int
+        psdf = psdf.loc[psdf['Pident'] >= pident]
+        # if pident threshold is to high, the next maximum value of pident is
+        # notified in log file
+        if psdf.empty:
+            alt_pident = psdf.loc[:, "Pident"].max()
+            logger.error('Warning: for prot_id ' + str(pident) +
+                         ', the variable "Pident" equal to ' +
+                         str(pident) + ' is too high.\n A threshold lower than or equal to ' +
+                         str(alt_pident) + ' would retrieve results.')
+
+            raise IOError()
+    if evalue is not None:
+        logger.info('Filtering interfaces by evalue = ' +
+                    str(evalue) + '%.')
+        # filter by pident
+        evalue = float(evalue)  # from str to int
+        psdf = psdf.loc[psdf['Evalue'] >= evalue]
+        # if pident threshold is to high, the next maximum value of pident is
+        # notified in log file
+        if psdf.empty:
+            alt_evalue = psdf.loc[:, "Evalue"].min()
+            logger.error('Warning: for prot_id ' + str(evalue) +
+                         ', the variable "Evalue" equal to ' +
+                         str(evalue) + ' is too low.\n A threshold higher than or equal to ' +
+                         str(alt_evalue) + ' would retrieve results.')
+
+            raise IOError()
+    # sorted by position to be joined with the variants
+    return psdf.sort_values('Protein_position', kind='mergesort')
+
+
+# amino acids letters
+aa = ['I', 'M','T','N', 'K', 'S', 'R', 'L', 
+     'P', 'H', 'Q', 'V','A', 'D',
+     'E','G','F', 'Y', 'C', 'W','X']
+
+# columns of the structural data only describing interfaces
+interface_columns = ['Chimera_interacting_position', 'Chimera_3D_position',
+                     'PDB_interacting_3D_position','PDB_interacting_aa',
+                     'Interface_min_distance', 'PDB_interacting_B_factor',
+                     'PDB_interacting_chain', 'Interaction_type']
+
+
+def load_variants(transcript_id, vardb, consequence, var_id, columns, logger):
+    '''
+    Parse the variants of a transcript, filter them by consequence and
+    variant id and spread the ranges of positions.
+
+    Parameters
+    ----------
+    transcript_id : str
+        Ensembl transcript ID
+    vardb : str
+        Directory where to find positions database
+    consequence : list
+        Consequence types to keep, all of them if None.
+    var_id : list
+        Variant ids to keep, all of them if None.
+    columns : list
+        Columns to read, all of them if None.
+    logger : logger
+        Logger.
+
+    Returns
+    -------
+    df
+        Variants of the transcript. IOError is raised if there are none.
+    '''
+    annovars = parser(transcript_id, vardb, columns, variants_dtypes)
+    if consequence is not None:
+        annovars = select_consequences(annovars, consequence, vardb)
+        logger.info('Filter of features = ' + str(consequence))
+
+        # if filter returns an empty df, raise error
+        if annovars.empty is True:
+            logger.error(
+                'positions could not be filtered by feature type = ' + str(consequence))
+            raise IOError()
+
+    # filter by position type if one or more selected
+    if var_id is not None:
+        annovars = select_positions(annovars, var_id)
+        logger.info('position \'' + str(var_id) + '\' has been selected.')
+        # if filter returns an empty df, raise error
+        if annovars.empty:
+            logger.error(
+                'positions could not be filtered by position id \'' + str(var_id) + '\'')
+            raise IOError()
+    # for positions with high impact affecting several aminoacidic positions,
+    # the protein position is a range. split the range to have each position
+    # individually
+    return expand_ranges(annovars, 'Protein_position')
+
+
+def unstructured(annovars):
+    '''
+    Locate the variants of a protein without structural data.
+
+    Parameters
+    ----------
+    annovars : df
+        Variants.
+
+    Returns
+    -------
+    dict
+        Noncoding and unmapped positions.
+    '''
+    results = {}
+    # remove non protein coding positions
+    annovars = annovars.drop_duplicates()
+    try:
+        coding_positions_index = coding_mask(annovars, aa)
+        noncoding_positions = annovars.loc[~coding_positions_index]
+    except:
+        noncoding_positions = False
+    # non-protein coding mutations
+    if noncoding_positions is not False:
+        noncoding_positions['Mapping_position'] = mapping_position(noncoding_positions, 'Noncoding')
+        results['NoncodingPositions'] = noncoding_positions
+        unmapped_positions = annovars.loc[coding_positions_index]
+    else:
+        unmapped_positions = annovars
+
+    if unmapped_positions.empty is False:
+        unmapped_positions = unmapped_positions.drop_duplicates()
+        unmapped_positions['Mapping_position'] = mapping_position(unmapped_positions, 'Unmapped')
+        results['UnmappedPositions'] = unmapped_positions
+    return results
+
+
+def locate(annovars, psdf, prot_id, loc, group=None):
+    '''
+    Map variants to the structural data of their protein.
+
+    Parameters
+    ----------
+    annovars : df
+        Variants.
+    psdf : df
+        Structural data sorted by position (by group and position if
+        group is given).
+    prot_id : str
+        Protein ID. Ignored if group is given.
+    loc : bool
+        Locate the positions that are not in an interface.
+    group : str
+        Column of annovars and psdf with an integer code of the protein, to
+        map the variants of many proteins at once. Then annovars must have
+        the protein ID of every row in '_accession'.
+
+    Returns
+    -------
+    dict
+        Noncoding, unmapped, structure and interface positions and the
+        setID rows, if any. An interface and a setID entry are always
+        present if any position was mapped.
+    '''
+    results = {}
+    # Merge them both files
+    mapped_positions, mapped = position_join(annovars, psdf, 'Protein_position', group)
+    ###########################################################################
+    # Locate rest of positions (mapping to a structure or not)
+    ###########################################################################
+    if loc:
+        # remove already mapped positions
+        left_positions = annovars.loc[~mapped]
+
+        # remove non protein coding positions
+        if left_positions.empty is False:
+            left_positions = left_positions.drop_duplicates()
+            coding_positions_index = coding_mask(left_positions, aa)
+            noncoding_positions = left_positions.loc[~coding_positions_index]
+            # non-protein coding mutations
+            if noncoding_positions.empty is False:
+                noncoding_positions['Mapping_position'] = mapping_position(noncoding_positions, 'Noncoding')
+                results['NoncodingPositions'] = noncoding_positions
+                left_positions = left_positions.loc[coding_positions_index]
+                del(noncoding_positions, coding_positions_index)
+
+            left_positions['Protein_accession'] = prot_id if group is None \
+                else left_positions['_accession']
+            left_positions['Protein_position'] = left_positions['Protein_position'].astype(int)
+
+            # positions within the alignment of any structure of the protein.
+            # With many proteins, positions and alignments are offset by
+            # their protein so that they never overlap another protein
+            positions = left_positions['Protein_position'].to_numpy(np.int64)
+            starts = psdf['Protein_alignment_start'].to_numpy(np.int64)
+            ends = psdf['Protein_alignment_end'].to_numpy(np.int64)
+            if group is not None:
+                positions = positions + (left_positions[group].to_numpy(np.int64) << 32)
+                starts = starts + (psdf[group].to_numpy(np.int64) << 32)
+                ends = ends + (psdf[group].to_numpy(np.int64) << 32)
+            unmapped_positions = left_positions.loc[covered(positions, starts, ends)]
+            del(left_positions)
+
+            if not unmapped_positions.empty:
+                cs = annovars.columns.values.tolist()
+                cs.append("Protein_accession")
+                unmapped_positions = unmapped_positions[[c for c in unmapped_positions.columns if c in cs]]
+                unmapped_positions = unmapped_positions.drop_duplicates()
+                unmapped_positions['Mapping_position'] = mapping_position(unmapped_positions, 'Unmapped')
+                results['UnmappedPositions'] = unmapped_positions
+                del(unmapped_positions)
+        # mapped position is on the rest of the structure
+        structure_positions = mapped_positions[mapped_positions['Interaction_type'].isna()]
+        structure_positions = structure_positions.drop(interface_columns, axis=1, errors = 'ignore')
+        #do proper arragenments if no resulst are retrieved
+        if structure_positions.empty is False:
+            structure_positions = structure_positions.drop_duplicates()
+            structure_positions['Mapping_position'] = mapping_position(structure_positions, 'Structure')
+            results['StructurePositions'] = structure_positions
+        del (structure_positions)
+    ###########################################################################
+    # if merging was successful, create setID file and
+    # save the merged dataframe as well
+    if not mapped_positions.empty:
+        mapped_positions['Mapping_position'] = mapping_position(mapped_positions, 'Interface')
+        mapped_positions = mapped_positions[mapped_positions['Interaction_type'].notna()]
+        setID_file = mapped_positions[['Structure_feature_id', 'Uploaded_variation'] +
+                                      [c for c in ['_task'] if c in mapped_positions.columns]]
+        results['setID'] = setID_file.drop_duplicates()
+        results['InterfacePositions'] = mapped_positions.drop_duplicates()
+    return results
+
+
+def write_results(prot_id, out_dir, pident, isoform, consequence, results, csv=False, hdf=False, parquet=False):
+    '''
+    Write the located positions of a protein (or of many proteins, with
+    prot_id None) to the output files, appending results and not
+    repeating headers.
+    '''
+    for maptype in ['NoncodingPositions', 'UnmappedPositions', 'StructurePositions']:
+        if maptype in results:
+            write_positions(prot_id, out_dir, pident, isoform, consequence,
+                            results[maptype], maptype, csv, hdf, parquet)
+    if 'setID' in results:
+        append_csv(os.path.join(out_dir, ('setID_pident' + str(pident) + '_isoform_' +
+                                          '_'.join(isoform) + '_consequence_' + '_'.join(consequence) + '.txt')),
+                   results['setID'][['Structure_feature_id', 'Uploaded_variation']])
+        write_positions(prot_id, out_dir, pident, isoform, consequence,
+                        results['InterfacePositions'], 'InterfacePositions', csv, hdf, parquet)
+
+
+def write_positions(prot_id, out_dir, pident, isoform, consequence, df, maptype, csv=False, hdf=False, parquet=False):
+    '''
+    Write positions of one protein, or of many proteins (prot_id None)
+    with their IDs in '_accession' (one HDF5 file per protein).
+    '''
+    if prot_id is not None:
+        writefile(prot_id, out_dir, pident, isoform, consequence, df, maptype, csv, hdf, parquet)
+        return
+    writefile(None, out_dir, pident, isoform, consequence, df, maptype, csv, False, parquet)
+    if hdf:
+        for acc, g in df.groupby('_accession', observed=True, sort=False):
+            writefile(acc, out_dir, pident, isoform, consequence, g, maptype, False, True)
+
+
+def mapper(prot_id,  gene_id, transcript_id, psdb, vardb, out_dir, pident, evalue, isoform, APPRIS, consequence, loc, var_id=None, csv=False, hdf=False, frame_cache=None, parquet=False):
     print(prot_id)
     '''
     Map interfaces and genomic anntoated positions and returns a
@@ -37,6 +372,10 @@ def mapper(prot_id,  gene_id, transcript_id, psdb, vardb, out_dir, pident, evalu
         Output directory
     pident : int
         Thershold of sequence identity (percertage).
+    frame_cache : FrameCache
+        Cache of parsed structural data shared with other calls, if any.
+    parquet : bool
+        Write the positions to the partitioned Parquet dataset.
 
     Returns
     -------
@@ -49,156 +388,28 @@ def mapper(prot_id,  gene_id, transcript_id, psdb, vardb, out_dir, pident, evalu
     '''
     # log file
     logger = get_logger(' 3dmapper', out_dir)
-    # amino acids letters
-    aa = ['I', 'M','T','N', 'K', 'S', 'R', 'L', 
-     'P', 'H', 'Q', 'V','A', 'D',
-     'E','G','F', 'Y', 'C', 'W','X']
+    # columns needed for the requested outputs
+    var_columns, struct_columns = projection(csv or parquet, hdf)
     # parse positions corresponding to the selected protein ID
     try:
-        annovars = parser(transcript_id, vardb)     
-        if consequence is not None:
-            annovars = annovars[annovars['Consequence'].astype(
-                str).str.contains('|'.join(consequence))]
-            logger.info('Filter of features = ' + str(consequence))
-
-            # if filter returns an empty df, raise error
-            if annovars.empty is True:
-                logger.error(
-                    'positions could not be filtered by feature type = ' + consequence)
-                raise IOError()
-        else:
-            consequence = ['all']
-
-        if isoform is None:
-            isoform = ['all']
-
-        # filter by position type if one or more selected
-        if var_id is not None:
-            if 'Existing_variation' in annovars.columns:
-                annovars = annovars[
-                    (annovars.Uploaded_variation.astype(str) == str(var_id)) |
-                    (annovars.Existing_variation.astype(str) == str(var_id))]
-            else:
-                annovars = annovars[
-                    (annovars.Uploaded_variation.astype(str) == str(var_id))]
-            logger.info('position \'' + str(var_id) + '\' has been selected.')
-            # if filter returns an empty df, raise error
-            if annovars.empty:
-                logger.error(
-                    'positions could not be filtered by position id \'' + str(var_id) + '\'')
-                raise IOError()
-        # for positions with high impact affecting several aminoacidic positions,
-        # the protein position is a range. split the range to have each position
-        # individually
-        if any(annovars['Protein_position'].astype(str).str.contains(r'[0-9]-[0-9]')):
-            # subset hight impact positions
-            sub_df = annovars[annovars['Protein_position'].astype(str).str.contains(
-                r'[0-9]-[0-9]')]
-            # subset the remaining positions to concatenate afterwards
-            remaining_df = annovars.drop(sub_df.index)
-            # split the range or interval
-            sub_df[['start', 'end']] = sub_df['Protein_position'].str.split(
-                '-', expand=True)
-            # sometimes the start or the end position of the interval is a
-            # question mark. In that case, we take into account the
-            # remaining value of the interval
-            if any(sub_df['start'].str.contains('\?')):
-                sub_df['start'] = np.where(sub_df['start'] == '?', sub_df['end'],
-                                           sub_df['start'])
-            if any(sub_df['end'].str.contains('\?')):
-                sub_df['end'] = np.where(sub_df['end'] == '?', sub_df['start'],
-                                         sub_df['end'])
-            # create the range of numbers defined by the interval
-            sub_df['Protein_position'] = sub_df.apply(lambda x: list(
-                range(int(x['start']), int(x['end'])+1)), 1)
-            # spread each individual position into one row
-            sub_df = explode2(sub_df, ['Protein_position'])
-            # drop unnecesary columns
-            sub_df = sub_df.drop(['start', 'end'], axis=1)
-            # concatenate final result
-            annovars = pd.concat([remaining_df, sub_df], sort=False)
-            annovars = annovars.reset_index(drop=True)
+        annovars = load_variants(transcript_id, vardb, consequence, var_id, var_columns, logger)
     except IOError:
         annovars = False
-     # parse interfaces corresponding to the selected protein ID
+    if consequence is None:
+        consequence = ['all']
+    if isoform is None:
+        isoform = ['all']
+     # parse interfaces corresponding to the selected protein ID, or
+    # reuse them if another transcript of this worker mapped to it
     try:
-        psdf = parser(prot_id, psdb)
-        psdf = psdf.astype({"Protein_position":str, "Protein_accession":str, "Protein_length":np.int32,
-                            "PDB_chain_length":np.int32,
-                            "PDB_3D_position":np.int32, "PDB_seq_position":np.int32, "Evalue":float, 
-                            "Pident":float,
-                            "Protein_alignment_start":np.int32, 
-                            "Protein_alignment_end":np.int32,"PDB_alignment_start":np.int32, 
-                            "PDB_alignment_end":np.int32, "Structure_feature_id":str})
-
-        if 'Pident' not in list(psdf.columns):
-            logger.error(' Wrong structural data format. Header is missing')
-            raise IOError()
-        psdf = psdf.loc[psdf.Pident != 'Pident']
-        logger.info('Protein features file of ' + prot_id + ' parsed.')
-        # Get col PDB_position
-        # if database is compacted and explode is needed
-        columns_type = psdf.applymap(lambda x: isinstance(x, list)).all()
-        columns_list = columns_type.index[columns_type].tolist()
-
-        # cols_stack
-        #cols_stack = psdf.apply(lambda x: x.astype(
-        #    str).str.match(r'[a-zA-Z0.-9]+/[a-zA-Z0.-9]+'))
-        #colsnames_stack = psdf.columns[cols_stack.any()].tolist()
-        # add column for chimera script
-        #if 'PDB_interacting_3D_position' in colsnames_stack:
-            #psdf['Interface_interacting_positions'] = psdf['PDB_interacting_position']  
-        #    psdf['Chimera_interacting_position'] = psdf['PDB_interacting_3D_position']
-        #if 'Evalue' in colsnames_stack:
-        #    colsnames_stack.remove('Evalue')
-        #if 'PDB_code' in colsnames_stack:
-        #    colsnames_stack.remove('PDB_code')
-        #if 'PDB_3D_position' in colsnames_stack:
-            #colsnames_stack.remove('PDB_3D_position')
-        #    psdf['Chimera_3D_position'] = psdf['PDB_3D_position']
-        #if 'Structure_feature_id' in colsnames_stack:
-        #    colsnames_stack.remove('Structure_feature_id')
-        #if any(colsnames_stack):
-        #    psdf = explode(psdf , colsnames_stack, '/')
-        #if any(columns_list):
-        #    psdf = explode(
-        #        psdf, columns_list, '/')
-        #else:
-        #    psdf[colsnames_stack] = \
-        #        psdf[colsnames_stack].astype(str)
-        # if default database is used minor modifications are needed
+        key = (prot_id, pident, evalue, struct_columns and tuple(struct_columns))
+        psdf = None if frame_cache is None else frame_cache.get(key)
+        if psdf is None:
+            psdf = parse_structures(prot_id, psdb, pident, evalue, struct_columns, logger)
+            if frame_cache is not None:
+                frame_cache.put(key, psdf)
         if pident is not None:
-            logger.info('Filtering interfaces by pident = ' +
-                        str(pident) + '%.')
-            # filter by pident
-            pident = float(pident)  # from str to int
-            psdf = psdf.loc[psdf['Pident'] >= pident]
-            # if pident threshold is to high, the next maximum value of pident is
-            # notified in log file
-            if psdf.empty:
-                alt_pident = psdf.loc[:, "Pident"].max()
-                logger.error('Warning: for prot_id ' + str(pident) +
-                             ', the variable "Pident" equal to ' +
-                             str(pident) + ' is too high.\n A threshold lower than or equal to ' +
-                             str(alt_pident) + ' would retrieve results.')
-
-                raise IOError()
-        if evalue is not None:
-            logger.info('Filtering interfaces by evalue = ' +
-                        str(evalue) + '%.')
-            # filter by pident
-            evalue = float(evalue)  # from str to int
-            psdf = psdf.loc[psdf['Evalue'] >= evalue]
-            # if pident threshold is to high, the next maximum value of pident is
-            # notified in log file
-            if psdf.empty:
-                alt_evalue = psdf.loc[:, "Evalue"].min()
-                logger.error('Warning: for prot_id ' + str(evalue) +
-                             ', the variable "Evalue" equal to ' +
-                             str(evalue) + ' is too low.\n A threshold higher than or equal to ' +
-                             str(alt_evalue) + ' would retrieve results.')
-
-                raise IOError()       
+            pident = float(pident)
     except IOError:
         psdf = False
 
@@ -215,170 +426,22 @@ def mapper(prot_id,  gene_id, transcript_id, psdb, vardb, out_dir, pident, evalu
     elif psdf is False and annovars is not False:
 
         if loc:
-            # remove non protein coding positions
-            annovars = annovars.drop_duplicates()
-            try:
-                coding_positions_index = annovars.Amino_acids.str.contains(
-                    '|'.join(aa), regex=True, na=False)
-                noncoding_positions = annovars.loc[~coding_positions_index]
-            except:
-                noncoding_positions = False
-            # non-protein coding mutations
-            if noncoding_positions is not False:
-                if APPRIS is not None: 
-                    noncoding_positions['APPRIS_isoform'] = APPRIS
-                noncoding_positions['Mapping_position'] = 'Noncoding'
-                writefile(prot_id, out_dir, float(pident), isoform, consequence,
-                          noncoding_positions, 'NoncodingPositions', csv, hdf)
-                unmapped_positions = annovars.loc[coding_positions_index]
-            else:
-                unmapped_positions = annovars
-
-            if unmapped_positions.empty is False:
-                unmapped_positions = unmapped_positions.drop_duplicates()
-                if APPRIS is not None: 
-                    unmapped_positions['APPRIS_isoform'] = APPRIS
-                
-                unmapped_positions['Mapping_position'] = 'Unmapped'
-                writefile(prot_id, out_dir, float(pident), isoform, consequence,
-                          unmapped_positions, 'UnmappedPositions', csv, hdf)
+            if APPRIS is not None: 
+                annovars['APPRIS_isoform'] = APPRIS
+            write_results(prot_id, out_dir, float(pident), isoform, consequence,
+                          unstructured(annovars), csv, hdf, parquet)
    
     elif psdf is not False and annovars is not False:
-        # for sucessful merge, Protein_position column must be str type
-        if 'Protein_position' in psdf.columns and 'Protein_position' in annovars.columns:
-            psdf['Protein_position'] = psdf['Protein_position'].astype(str)
-            annovars['Protein_position'] = annovars['Protein_position'].astype(str)
-        else: 
+        if 'Protein_position' not in psdf.columns or 'Protein_position' not in annovars.columns:
             raise IOError
             
         if APPRIS is not None:
             annovars['APPRIS_isoform'] = APPRIS
-       # annovars['Uniprot_accession'] = Uniprot_id
-        # Merge them both files
-        mapped_positions = annovars.join(
-            psdf.set_index('Protein_position'), on='Protein_position', how='inner')
-        if isoform is None:
-            isoform = ['all']
-        if consequence is None:
-            consequence = ['all']
-        ###########################################################################
-        # Locate rest of positions (mapping to a structure or not)
-        ###########################################################################
-        if loc:
-            # remove already mapped positions
-            try:
-                left_positions = annovars.drop(list(set(mapped_positions.index)))
-            except:
-                left_positions = annovars
-
-            # remove non protein coding positions
-            if left_positions.empty is False:
-                left_positions = left_positions.drop_duplicates()
-                coding_positions_index = left_positions.Amino_acids.str.contains(
-                    '|'.join(aa), regex=True, na=False)
-                noncoding_positions = left_positions.loc[~coding_positions_index]
-                # non-protein coding mutations
-                if noncoding_positions.empty is False:
-                   # noncoding_positions = noncoding_positions.drop(
-                   #     columns=['Uniprot_accession'])  # not needed
-                    noncoding_positions['Mapping_position'] = 'Noncoding'
-                    writefile(prot_id, out_dir, pident, isoform, consequence,
-                              noncoding_positions, 'NoncodingPositions', csv, hdf)
-                    left_positions = left_positions.loc[coding_positions_index]
-                    del(noncoding_positions, coding_positions_index)
-                
-                left_positions['Protein_accession'] = prot_id
-                left_positions['Protein_position'] = left_positions['Protein_position'].astype(int)
-
-                # remove protein position since we know there are no matching positions
-                # and will reduce the maximum number of combinations of rows
-                #pdb.id ensembl.prot.id temp.chain int.chain 
-                """psdf = psdf.loc[:, ['PDB_code', 'Protein_accession',
-                                    'PDB_chain', 'Protein_alignment_start',
-                                     'Protein_alignment_end', 'PDB_alignment_start',
-                                      'PDB_alignment_end', 'Pident']]
-                """
-                psdf = psdf[['Protein_accession', 'Protein_alignment_start', 'Protein_alignment_end']]
-                #psdf = psdf.iloc[:, np.r_[0:3, 4:9]]
-                psdf = psdf.drop_duplicates()
-                # merge rest of positions with protein structures
-                unmapped_positions = left_positions.join(
-                    psdf.set_index('Protein_accession'), on='Protein_accession', how='inner')
-                # convert col to numeric to make comparison
-                #unmapped_positions['Protein_position'] = pd.to_numeric(
-                #    unmapped_positions['Protein_position'], errors='coerce')
-                del(left_positions)
-
-                unmapped_positions[
-                    (unmapped_positions["Protein_position"] >= unmapped_positions["Protein_alignment_start"]) & 
-                    ((unmapped_positions["Protein_position"] <= unmapped_positions["Protein_alignment_end"]))]
-                if not unmapped_positions.empty:
-                    cs = annovars.columns.values.tolist()
-                    cs.append("Protein_accession")
-                    unmapped_positions = unmapped_positions[[c for c in unmapped_positions.columns if c in cs]]
-                    unmapped_positions = unmapped_positions.drop_duplicates()
-                    unmapped_positions['Mapping_position'] = 'Unmapped'
-                    writefile(prot_id, out_dir, pident, isoform, consequence,
-                            unmapped_positions, 'UnmappedPositions', csv, hdf)
-                
-                    del(unmapped_positions)  
-                # mapped position is on the rest of the structure
-            structure_positions = mapped_positions[mapped_positions['Interaction_type'].isna()]
-            structure_positions = structure_positions.drop(['Chimera_interacting_position', 'Chimera_3D_position',
-                                                              'PDB_interacting_3D_position','PDB_interacting_aa',
-                                                              'Interface_min_distance', 'PDB_interacting_B_factor',
-                                                              'PDB_interacting_chain', 'Interaction_type'], axis=1, errors = 'ignore')
-            #do proper arragenments if no resulst are retrieved
-            if structure_positions.empty is False:
-                structure_positions = structure_positions.drop_duplicates()
-                #structure_positions['PDB_seq_position'] = structure_positions['Protein_position'] - \
-                # structure_positions['Protein_alignment_start'] + structure_positions['PDB_alignment_start']
-                structure_positions['Mapping_position'] = 'Structure'
-                writefile(prot_id, out_dir, pident, isoform, consequence,
-                        structure_positions, 'StructurePositions', csv, hdf)
-                    #unmapped_positions = left_positions#[~left_positions.index.isin(structure_positions.index)]
-
-                # if unmapped_positions.empty is False:
-                #     cs = annovars.columns.values.tolist()
-                #     cs.append("Protein_accession")  
-                #     unmapped_positions = unmapped_positions[[c for c in unmapped_positions.columns if c in cs]]
-                #     unmapped_positions.drop_duplicates(inplace=True)
-                #     unmapped_positions['Mapping_position'] = 'Unmapped'
-                #     writefile(prot_id, out_dir, pident, isoform, consequence,
-                #             unmapped_positions, 'UnmappedPositions', csv, hdf)
-                # else:
-                #     try:
-                #         unmapped_positions = left_positions
-                #         if unmapped_positions.empty is False:
-                #             unmapped_positions.drop_duplicates(inplace=True)
-                #             unmapped_positions['Mapping_position'] = 'Unmapped'
-                #             writefile(prot_id, out_dir, pident, isoform, consequence,
-                #                       unmapped_positions, 'Unmappedpositions', csv, hdf)
-                #     except:
-                #         pass
-                del (structure_positions)
-        ###########################################################################
+        results = locate(annovars, psdf, prot_id, loc)
         # stop if there are no results
-        if mapped_positions.empty:
+        if 'setID' not in results:
             # report results
             logger.warning('Warning: ' + prot_id +
                            ' does not map with any annotated position.\n')
-        # if merging was successful, create setID file and
-        # save the merged dataframe as well
-        else:
-            mapped_positions['Mapping_position'] = 'Interface'
-            mapped_positions = mapped_positions[mapped_positions['Interaction_type'].notna()]
-            setID_file = mapped_positions[['Structure_feature_id',
-                                          'Uploaded_variation']]
-            setID_file = setID_file.drop_duplicates()
-            mapped_positions = mapped_positions.drop_duplicates()
-            # Save the merged dataframe, appending results and not
-            #  reapeting headers
-            with open(os.path.join(out_dir, ('setID_pident' + str(pident) + '_isoform_' +
-                                             '_'.join(isoform) + '_consequence_' + '_'.join(consequence) + '.txt')), 'a') as f:
-                setID_file.to_csv(f, sep=',', index=False,
-                                  header=f.tell() == 0)
-            writefile(prot_id, out_dir, pident, isoform, consequence,
-                      mapped_positions, 'InterfacePositions', csv, hdf)
-            del(mapped_positions)
-        del(psdf, annovars)
+        write_results(prot_id, out_dir, pident, isoform, consequence, results, csv, hdf, parquet)
+        del(psdf, annovars, results)
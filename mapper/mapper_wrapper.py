@@ -4,25 +4,26 @@ import pandas as pd
 import numpy as np
 import glob
 import os
-import re
 from subprocess import call
 import itertools
 from .logger import get_logger
+from .select_positions import select_positions
+from .stats import peak_rss
 from .translate import translate
+from .var_index import load_variant_index
+from .consequences import coding_mask
 from .db_parser import parser
-from .mapper import mapper
+from .frame_cache import get_frame_cache
+from .mapper import mapper, mapping_position
 from .decorator import tags
-from .run_subprocess import call_subprocess
 from .writefile import writefile
+from .writer import set_queue
 
 
 # Emojis
 DNA = '\U0001F9EC'
 
 # decorator to monitor function
-detect_column = "grep -v '##' {} | awk -F ' ' '{{for(i=1;i<=NF;i++) \
-{{if ($i ~ /{}/){{print i; exit}}}}}}' "
-
 aa = ['I', 'M','T','N', 'K', 'S', 'R', 'L', 
      'P', 'H', 'Q', 'V','A', 'D',
      'E','G','F', 'Y', 'C', 'W']
@@ -33,16 +34,68 @@ aa = ['I', 'M','T','N', 'K', 'S', 'R', 'L',
 #       emoji=DNA)
 
 
-def wrapper(id, psdb, vardb, out_dir, pident, evalue, isoform, consequence, loc, index_file, dict_geneprot, varid=None, csv = False, hdf = False):
+def locate_transcript(transcript_id, vardb, out_dir, pident, isoform, consequence, varid,
+                      csv, hdf, parquet, logger):
+    '''
+    Write the noncoding and unmapped positions of a transcript whose
+    protein has no structural data.
+    '''
+    annovars_left = parser(transcript_id, vardb)
+    # filter by position type if one or more selected
+    if varid is not None:
+        annovars_left = select_positions(annovars_left, varid)
+        logger.info('position \'' + str(varid) + '\' has been selected.')
+        # if filter returns an empty df, raise error
+        if annovars_left.empty:
+            logger.error(
+                'positions could not be filtered by position id \'' + str(varid) + '\'')
+            raise IOError()
+    try: 
+        coding_positions_index = coding_mask(annovars_left, aa)
+        noncoding_positions = annovars_left.loc[~coding_positions_index]
+    except: 
+        noncoding_positions = False 
+    if isoform is None:
+        isoform = ['all']
+    if consequence is None:
+        consequence = ['all']  
+    # non-protein coding mutations
+    if noncoding_positions is not False:
+        #noncoding_positions['APPRIS_isoform'] = ''
+        noncoding_positions['Mapping_position'] = mapping_position(noncoding_positions, 'Noncoding')
+        writefile(transcript_id, out_dir, float(pident), isoform, consequence, noncoding_positions, 'NoncodingPositions', csv, hdf, parquet)
+        unmapped_positions = annovars_left[coding_positions_index]
+    else: 
+        unmapped_positions = annovars_left
+            
+    if len(unmapped_positions) > 0:
+        #unmapped_positions = unmapped_positions.iloc[:, 0:16]
+        unmapped_positions.drop_duplicates()
+       # unmapped_positions['APPRIS_isoform'] = ''
+        unmapped_positions['Mapping_position'] = mapping_position(unmapped_positions, 'Unmapped')
+        writefile(transcript_id, out_dir, float(pident), isoform, consequence, unmapped_positions, 'UnmappedPositions', csv, hdf, parquet)
+
+
+def wrapper(id, psdb, vardb, out_dir, pident, evalue, isoform, consequence, loc, index_file, dict_geneprot, varid=None, csv = False, hdf = False, ids=None, cache_size=None, queue=None, parquet=False):
     
     # logging
     logger = get_logger('wrapper', out_dir)
+    # send results to the output writer, if any
+    set_queue(queue)
+    # structural data parsed by previous calls of this worker
+    frame_cache = get_frame_cache(cache_size) if cache_size else None
+    counters = frame_cache.counters() if frame_cache is not None else None
+    # ids already translated (and reported if missing) by translate_many
+    translated = ids is not None
     # translate ensembl id
     try:
         if id == '-': 
             raise IOError()
-        ids = translate(
-            id,  out_dir, dict_geneprot, isoform)
+        if not translated:
+            ids = translate(
+                id,  out_dir, dict_geneprot, isoform)
+        elif not ids:
+            raise IOError()
 
         gene_id, prot_id, transcript_id = ids['geneID'], ids['protID'], ids['transcriptID']
         
@@ -67,7 +120,9 @@ def wrapper(id, psdb, vardb, out_dir, pident, evalue, isoform, consequence, loc,
                           loc,
                           varid,
                           csv,
-                          hdf)
+                          hdf,
+                          frame_cache,
+                          parquet)
         # error handling
             except IOError:
                 if varid is None:
@@ -81,68 +136,22 @@ def wrapper(id, psdb, vardb, out_dir, pident, evalue, isoform, consequence, loc,
      # error handling
     except IOError:
         if loc:
-            try: 
-                if id == '-':
-                    transcript_id = '-'
-                else: 
-                    cmd = ('grep -w \'{}\' {}').format(id, index_file)
-                    # call subprocess
-                    out, err = call_subprocess(cmd)
-                    #print(out, err)
-                    if err is None and out != b'':
-                        toprocess = out.decode('utf-8')
-                        # geneid correspond to the 2nd column in the line
-                        cmd2 = detect_column.format(index_file,'Feature')
-                        # execute subprocess
-                        out2, err2 = call_subprocess(cmd2)
-                        # error handling
-                        if err2 is None and out2 != b'':
-                            col_index_trasncriptid = re.findall('\d+', out2.decode('utf8'))[0]
-                            transcript_id = toprocess.split("")[col_index_trasncriptid]
-                        #transcript_id = [s for s in toprocess.split(
-                        #                    " ") if 'ENST' in s][0]
-                annovars_left = parser(transcript_id, vardb)
-                
-                    #annovars_left = annovars[annovars['Feature']==id]
-                            # filter by position type if one or more selected
-                if varid is not None:
-                    if 'Existing_variation' in annovars_left.columns:
-                        annovars_left =  annovars_left[
-                            (annovars_left.Uploaded_variation.astype(str) == str(varid)) |
-                            ( annovars_left.Existing_variation.astype(str) == str(varid)) ]
-                    else:
-                        annovars_left =  annovars_left[
-                            ( annovars_left.Uploaded_variation.astype(str) == str(varid))]
-                    logger.info('position \'' + str(varid) + '\' has been selected.')
-                    # if filter returns an empty df, raise error
-                    if annovars_left.empty:
-                        logger.error(
-                            'positions could not be filtered by position id \'' + str(varid) + '\'')
-                        raise IOError()
-                try: 
-                    coding_positions_index = annovars_left.Amino_acids.str.contains('|'.join(aa))
-                    noncoding_positions = annovars_left.loc[~coding_positions_index]
-                except: 
-                    noncoding_positions = False 
-                if isoform is None:
-                    isoform = ['all']
-                if consequence is None:
-                    consequence = ['all']  
-                # non-protein coding mutations
-                if noncoding_positions is not False:
-                    #noncoding_positions['APPRIS_isoform'] = ''
-                    noncoding_positions['Mapping_position'] = 'Noncoding'
-                    writefile(transcript_id, out_dir, float(pident), isoform, consequence, noncoding_positions, 'NoncodingPositions', csv, hdf)
-                    unmapped_positions = annovars_left[coding_positions_index]
-                else: 
-                    unmapped_positions = annovars_left
-                        
-                if len(unmapped_positions) > 0:
-                    #unmapped_positions = unmapped_positions.iloc[:, 0:16]
-                    unmapped_positions.drop_duplicates()
-                   # unmapped_positions['APPRIS_isoform'] = ''
-                    unmapped_positions['Mapping_position'] = 'Unmapped'
-                    writefile(transcript_id, out_dir, float(pident), isoform, consequence, unmapped_positions, 'UnmappedPositions', csv, hdf)
-            except:
-                pass
-        logger.error('Warning: {} has no matching ensembl ids.'.format(id))
+            # transcripts of the id in the sorted variant index
+            if id == '-':
+                transcript_ids = ['-']
+            else:
+                transcript_ids = load_variant_index(vardb, index_file).transcripts(id)
+            for transcript_id in transcript_ids:
+                try:
+                    locate_transcript(transcript_id, vardb, out_dir, pident, isoform, consequence,
+                                      varid, csv, hdf, parquet, logger)
+                except IOError:
+                    continue
+        if not translated:
+            logger.error('Warning: {} has no matching ensembl ids.'.format(id))
+    # cache counters of this call and memory of the worker
+    usage = {'peak_rss': peak_rss()}
+    logger.info('{}: peak RSS of the worker {:.1f} MB.'.format(id, usage['peak_rss']))
+    if frame_cache is not None:
+        usage.update({k: v - counters[k] for k, v in frame_cache.counters().items()})
+    return usage
@@ -0,0 +1,266 @@
+# coding: utf-8
+
+# Import necesary modules
+import io
+import os
+import glob
+import gzip
+import heapq
+import shutil
+import argparse
+import itertools
+import tempfile
+import pandas as pd
+
+from joblib import Parallel, delayed
+
+from .logger import get_logger
+from .writer import compress_block, compressed_extensions
+
+# output files of a run merged by concatenation
+merged_patterns = ['setID_*.txt*', os.path.join('csv', '*.csv*')]
+
+
+def parse_commandline():
+    '''
+    Parse inputs of the merge subcommand from command line.
+
+    Returns
+    -------
+    args
+        arguments to give to the functions
+    '''
+    parser = argparse.ArgumentParser(
+        prog='mapper merge',
+        description='Combine the outputs of the shards of a run (--shard i/N) '
+                    'into one output directory.')
+    parser.add_argument('shards', nargs='+', metavar='<String>',
+                        help='output directories of the shards, or the output directory '
+                             'given to every shard')
+    parser.add_argument('-o', '--out', dest='out', metavar='<String>', required=True,
+                        help='output directory of the merged run')
+    parser.add_argument('-j', '--jobs', dest='njobs', metavar='<int>', type=int,
+                        default=1, help='number of files to merge in parallel')
+    args = parser.parse_args()
+    del(parser)
+    return args
+
+
+def shard_dirs(paths):
+    '''
+    Output directories of the shards, sorted by shard: the given ones and
+    the shard_i_of_N subdirectories of the given ones.
+    '''
+    dirs = []
+    for path in paths:
+        found = glob.glob(os.path.join(path, 'shard_*_of_*'))
+        dirs.extend(found if found else [path])
+    return sorted(set(dirs), key=lambda d: [int(p) if p.isdigit() else p
+                                            for p in os.path.basename(d).split('_')])
+
+
+def compression_of(path):
+    '''
+    Compression of an output file from its extension, None if plain.
+    '''
+    for compression, ext in compressed_extensions.items():
+        if path.endswith(ext):
+            return compression
+    return None
+
+
+def open_text(path):
+    '''
+    Open a plain, gzip or zstd output file as text.
+    '''
+    compression = compression_of(path)
+    if compression == 'gzip':
+        return gzip.open(path, 'rt')
+    if compression == 'zstd':
+        import zstandard
+        return io.TextIOWrapper(zstandard.ZstdDecompressor().stream_reader(
+            open(path, 'rb'), read_across_frames=True))
+    return open(path)
+
+
+class BlockWriter:
+    '''
+    Write text to a plain file, or in independent gzip or zstd blocks as
+    the mapper does.
+    '''
+
+    def __init__(self, path, block_bytes=1024 ** 2):
+        self.compression = compression_of(path)
+        self.file = open(path, 'wb' if self.compression else 'w')
+        self.block_bytes = block_bytes
+        self.buffer, self.size = [], 0
+
+    def write(self, text):
+        if self.compression is None:
+            self.file.write(text)
+            return
+        self.buffer.append(text)
+        self.size += len(text)
+        if self.size >= self.block_bytes:
+            self.flush()
+
+    def flush(self):
+        if self.buffer:
+            self.file.write(compress_block(''.join(self.buffer), self.compression))
+            self.buffer, self.size = [], 0
+
+    def close(self):
+        self.flush()
+        self.file.close()
+
+
+def shard_rows(paths, headers, columns):
+    '''
+    Rows of the same output file of every shard, with the given columns.
+    Files with other columns are rewritten with pandas, in chunks.
+    '''
+    header = ','.join(columns) + '\n'
+    for path, h in zip(paths, headers):
+        with open_text(path) as f:
+            if h == header:
+                f.readline()
+                for line in f:
+                    yield line if line.endswith('\n') else line + '\n'
+                continue
+            for chunk in pd.read_csv(f, dtype=str, keep_default_na=False, chunksize=100000):
+                chunk = chunk.reindex(columns=columns, fill_value='')
+                yield from chunk.to_csv(index=False, header=False).splitlines(keepends=True)
+
+
+def unique_rows(rows, tmp_dir, run_rows=1000000):
+    '''
+    Distinct rows, in sorted order, in bounded memory: rows are sorted in
+    runs of run_rows written to temporary files, which are then merged
+    dropping repeated rows.
+    '''
+    runs = []
+    try:
+        while True:
+            run = sorted(set(itertools.islice(rows, run_rows)))
+            if not run:
+                break
+            f = tempfile.TemporaryFile('w+', dir=tmp_dir)
+            f.writelines(run)
+            f.seek(0)
+            runs.append(f)
+        previous = None
+        for row in heapq.merge(*runs):
+            if row != previous:
+                yield row
+                previous = row
+    finally:
+        for f in runs:
+            f.close()
+
+
+def merge_file(paths, out_file, dedupe=False):
+    '''
+    Concatenate the same output file of every shard with a single header.
+
+    If the shards have different columns (e.g. a column only written when
+    some protein has it), the rows are rewritten with the union of the
+    columns. setID files are deduplicated with an external sort, so their
+    rows are written sorted.
+
+    Parameters
+    ----------
+    paths : list
+        File of every shard having it.
+    out_file : str
+        Merged file.
+    dedupe : bool
+        Remove repeated rows.
+
+    Returns
+    -------
+    int
+        Rows written.
+    '''
+    headers = []
+    for path in paths:
+        with open_text(path) as f:
+            headers.append(f.readline())
+    # union of the columns, in order of appearance
+    columns = list(dict.fromkeys(c for h in headers for c in h.rstrip('\n').split(',')))
+    rows = shard_rows(paths, headers, columns)
+    if dedupe:
+        rows = unique_rows(rows, os.path.dirname(os.path.abspath(out_file)))
+    out = BlockWriter(out_file)
+    out.write(','.join(columns) + '\n')
+    n = 0
+    for row in rows:
+        out.write(row)
+        n += 1
+    out.close()
+    return n
+
+
+def copy_tree(src, dst, skip=()):
+    '''
+    Copy the files of a directory tree into another one, which may exist
+    already, except those named in skip.
+    '''
+    for root, _, files in os.walk(src):
+        target = os.path.join(dst, os.path.relpath(root, src))
+        os.makedirs(target, exist_ok=True)
+        for f in files:
+            if f not in skip:
+                shutil.copy2(os.path.join(root, f), os.path.join(target, f))
+
+
+def merge_parquet(dirs, out_dir):
+    '''
+    Gather the Parquet datasets of the shards. File names are unique to
+    each writer, so files are copied to the same partitions and the
+    common schema is rebuilt from those of the shards.
+    '''
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    schemas = {}
+    for d in dirs:
+        for dataset in glob.glob(os.path.join(d, 'parquet', '*')):
+            name = os.path.basename(dataset)
+            copy_tree(dataset, os.path.join(out_dir, 'parquet', name), skip=['_common_metadata'])
+            metadata = os.path.join(dataset, '_common_metadata')
+            if os.path.exists(metadata):
+                schemas.setdefault(name, []).append(pq.read_schema(metadata))
+    for name, s in schemas.items():
+        pq.write_metadata(pa.unify_schemas(s), os.path.join(out_dir, 'parquet', name, '_common_metadata'))
+
+
+def merge_hdf(dirs, out_dir):
+    '''
+    Gather the per-protein HDF5 files of the shards.
+    '''
+    for d in dirs:
+        if os.path.isdir(os.path.join(d, 'hdf5')):
+            copy_tree(os.path.join(d, 'hdf5'), os.path.join(out_dir, 'hdf5'))
+
+
+def main():
+    # parse command line options
+    args = parse_commandline()
+    dirs = shard_dirs(args.shards)
+    os.makedirs(args.out, exist_ok=True)
+    logger = get_logger('merge', args.out)
+    # same output file of every shard
+    files = {}
+    for d in dirs:
+        for pattern in merged_patterns:
+            for path in glob.glob(os.path.join(d, pattern)):
+                files.setdefault(os.path.relpath(path, d), []).append(path)
+    if any(os.path.dirname(f) == 'csv' for f in files):
+        os.makedirs(os.path.join(args.out, 'csv'), exist_ok=True)
+    rows = Parallel(n_jobs=args.njobs)(
+        delayed(merge_file)(paths, os.path.join(args.out, f), f.startswith('setID'))
+        for f, paths in files.items())
+    for (f, paths), n in zip(files.items(), rows):
+        logger.info('{}: {} rows from {} shards.'.format(f, n, len(paths)))
+    merge_parquet(dirs, args.out)
+    merge_hdf(dirs, args.out)
+    print('{} shards merged into {}.'.format(len(dirs), args.out))
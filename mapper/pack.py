@@ -0,0 +1,228 @@
+# coding: utf-8
+
+# Import necesary modules
+import os
+import gzip
+import shutil
+import tempfile
+import argparse
+import pandas as pd
+
+from .columnar import write_columnar
+from .db_parser import detect_schema, read_entry, structural_dtypes, variants_dtypes
+from .logger import get_logger
+from .manifest import Manifest
+from .packed import PACKED_DIR, PACKED_INDEX, index_columns, packed_view
+
+
+def parse_commandline():
+    '''
+    Parse inputs of the pack subcommand from command line.
+
+    Returns
+    -------
+    args
+        arguments to give to the functions
+    '''
+    parser = argparse.ArgumentParser(
+        prog='mapper pack',
+        description='Move the files of a structuralDB or varDB into a few large '
+                    'data files indexed by ID. Files added to the database '
+                    'afterwards take precedence over the packed ones until '
+                    'the database is packed again.')
+    parser.add_argument('-db', dest='db', metavar='<String>', required=True,
+                        help='structural or variants database directory')
+    parser.add_argument('--max-size', dest='max_size', metavar='<float>', type=float,
+                        default=4, help='maximum size of each data file in GB. Default is 4')
+    args = parser.parse_args()
+    del(parser)
+    return args
+
+
+def is_database_file(path, entry):
+    '''
+    Whether a file of a database directory is a variants or structural
+    database file (and not e.g. a log or an index).
+    '''
+    if entry['format'] != 'text':
+        return True
+    try:
+        return detect_schema(read_entry(path, entry, nrows=0).columns) is not None
+    except (pd.errors.EmptyDataError, pd.errors.ParserError, UnicodeDecodeError):
+        return False
+
+
+def entry_content(manifest, entry):
+    '''
+    Bytes of the file of a manifest entry, packed or not.
+    '''
+    path = manifest.filepath(entry)
+    if entry['offset'] >= 0:
+        return packed_view(path, int(entry['offset']), int(entry['size']))
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def text_lines(content, entry):
+    '''
+    Header and rows of a text database file.
+    '''
+    content = bytes(content)
+    if entry['compression'] == 'gzip':
+        content = gzip.decompress(content)
+    header, _, rows = content.partition(b'\n')
+    return header, rows
+
+
+def merge_entries(manifest, entries):
+    '''
+    Merge the files of an ID into one: the rows packed before followed by
+    those of a file added afterwards.
+
+    Text files with the same header are concatenated as they are, others
+    are parsed and rewritten in Arrow IPC.
+
+    Parameters
+    ----------
+    manifest : Manifest
+        Manifest of the database.
+    entries : list
+        Manifest entries of the files to merge.
+
+    Returns
+    -------
+    tuple
+        Content of the merged file, its format, compression, delimiter,
+        number of rows and text files it was converted from.
+    '''
+    contents = [entry_content(manifest, e) for e in entries]
+    if all(e['format'] == 'text' for e in entries):
+        lines = [text_lines(c, e) for c, e in zip(contents, entries)]
+        if len(set(h for h, _ in lines)) == 1 and \
+                len(set(e['delimiter'] for e in entries)) == 1:
+            content = lines[0][0] + b'\n' + b''.join(
+                r if not r or r.endswith(b'\n') else r + b'\n' for _, r in lines)
+            if entries[0]['compression'] == 'gzip':
+                content = gzip.compress(content)
+            return (content, 'text', entries[0]['compression'], entries[0]['delimiter'],
+                    int(sum(e['rows'] for e in entries)), '')
+    frames, sources = [], set()
+    for c, e in zip(contents, entries):
+        # the content is read as a standalone file
+        e = dict(e, offset=-1)
+        if e['format'] == 'text':
+            schema = detect_schema(read_entry(c, e, nrows=0).columns)
+            dtype = structural_dtypes if schema == 'structural' else variants_dtypes
+            frames.append(read_entry(c, e, dtype=dtype))
+        else:
+            frames.append(read_entry(c, e))
+            sources.update(n for n in e['sources'].split(',') if n)
+    df = pd.concat(frames, ignore_index=True)
+    fd, tmp = tempfile.mkstemp(dir=manifest.db_dir, prefix='.pack.')
+    os.close(fd)
+    try:
+        write_columnar(df, tmp, detect_schema(df.columns), 'arrow', sources=sorted(sources))
+        with open(tmp, 'rb') as f:
+            content = f.read()
+    finally:
+        os.remove(tmp)
+    return content, 'arrow', 'none', 'none', len(df), ','.join(sorted(sources))
+
+
+def pack_directory(db_dir, max_size, logger):
+    '''
+    Pack the files of a database directory.
+
+    Files are copied as they are (compressed or not, text or columnar) one
+    after another into ``<db_dir>/packed/data.<n>``, and
+    ``<db_dir>/packed/index`` records the data file, offset, length and
+    number of rows of each of them. Files written into the pack are then
+    removed from the directory.
+
+    A columnar file is packed instead of the text files it was converted
+    from, which are kept. Packing an already packed database merges a file
+    added afterwards for a packed ID with its packed rows. Other files of
+    an ID (e.g. a second columnar copy) are left in the directory.
+
+    Parameters
+    ----------
+    db_dir : str
+        Directory of the structural or variants database.
+    max_size : int
+        Maximum size in bytes of each data file.
+    logger : logger
+        Logger.
+
+    Returns
+    -------
+    df
+        Index of the packed files.
+    '''
+    manifest = Manifest(db_dir)
+    tmp_dir = os.path.join(db_dir, PACKED_DIR + '.tmp')
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+
+    index, written = [], []
+    data, n, offset = None, 0, 0
+    for id, files in manifest.df.groupby('id', sort=False):
+        files = [e for _, e in files.iterrows()
+                 if e['offset'] >= 0 or is_database_file(manifest.filepath(e), e)]
+        # text files converted to a columnar file of this ID are copies
+        converted = set(n for e in files for n in e['sources'].split(',') if n)
+        packed = [e for e in files if e['offset'] >= 0]
+        new = [e for e in files if e['offset'] < 0 and
+               not (e['format'] == 'text' and e['name'] in converted)]
+        # a single new file per ID, columnar first
+        new = sorted(new, key=lambda e: e['format'] == 'text')[:1]
+        # a new columnar file replaces the packed text file it was converted from
+        packed = [e for e in packed if not (e['format'] == 'text' and e['name'] in converted)]
+        parts = packed + new
+        if not parts:
+            continue
+        if len(parts) == 1:
+            e = parts[0]
+            content = entry_content(manifest, e)
+            fmt, compression, delimiter, rows, sources = \
+                e['format'], e['compression'], e['delimiter'], int(e['rows']), e['sources']
+        else:
+            content, fmt, compression, delimiter, rows, sources = merge_entries(manifest, parts)
+        if data is None or (offset > 0 and offset + len(content) > max_size):
+            if data is not None:
+                data.close()
+                n += 1
+            data, offset = open(os.path.join(tmp_dir, 'data.{:04d}'.format(n)), 'wb'), 0
+        data.write(content)
+        index.append((id, parts[-1]['name'], 'data.{:04d}'.format(n), offset, len(content),
+                      rows, fmt, compression, delimiter, sources))
+        offset += len(content)
+        written.extend(manifest.filepath(e) for e in new)
+    if data is not None:
+        data.close()
+
+    index = pd.DataFrame(index, columns=index_columns)
+    index.to_csv(os.path.join(tmp_dir, PACKED_INDEX), sep='\t', index=False)
+
+    # replace the previous pack
+    packed_dir = os.path.join(db_dir, PACKED_DIR)
+    if os.path.isdir(packed_dir):
+        os.rename(packed_dir, packed_dir + '.old')
+    os.rename(tmp_dir, packed_dir)
+    shutil.rmtree(packed_dir + '.old', ignore_errors=True)
+    logger.info('{} files packed into {} data files.'.format(len(index), n + 1 if len(index) else 0))
+
+    # remove the files written into the pack
+    for path in written:
+        os.remove(path)
+    logger.info('{} packed files removed from {}.'.format(len(written), db_dir))
+    return index
+
+
+def main():
+    # parse command line options
+    args = parse_commandline()
+    # log in the working directory, not in the database
+    logger = get_logger('pack', os.getcwd())
+    index = pack_directory(args.db, int(args.max_size * 1024 ** 3), logger)
+    print('{} files packed into {}.'.format(
+        len(index), os.path.join(args.db, PACKED_DIR)))
@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+
+# import necessary modules
+import os
+import mmap
+import pandas as pd
+
+# directory of a database holding its packed files
+PACKED_DIR = 'packed'
+
+# index of the packed files, inside PACKED_DIR
+PACKED_INDEX = 'index'
+
+# columns of the packed index. 'sources' lists the text files (comma
+# separated) a packed columnar file was converted from
+index_columns = ['id', 'name', 'file', 'offset', 'length', 'rows',
+                 'format', 'compression', 'delimiter', 'sources']
+
+# data files mapped by this process, keyed by path, with the inode and
+# modification time they were mapped at
+_maps = {}
+
+
+def read_pack_index(db_dir):
+    '''
+    Packed files of a database directory.
+
+    Parameters
+    ----------
+    db_dir : str
+        Directory of the variants or structural database.
+
+    Returns
+    -------
+    df
+        One row per packed file with its ID, original name, data file
+        (relative to the database directory), offset and length in the data file, number of
+        rows, format, compression, delimiter and the text files it was
+        converted from. Empty if the database is not packed.
+    '''
+    path = os.path.join(db_dir, PACKED_DIR, PACKED_INDEX)
+    if not os.path.isfile(path):
+        return pd.DataFrame(columns=index_columns)
+    df = pd.read_csv(path, sep='\t', dtype={'id': str, 'name': str, 'file': str, 'sources': str},
+                     keep_default_na=False)
+    df['file'] = PACKED_DIR + '/' + df['file']
+    if 'sources' not in df:
+        # packed before the sources were recorded
+        df['sources'] = ''
+    return df
+
+
+def packed_view(path, offset, length):
+    '''
+    Bytes of a packed file, read from the memory map of its data file.
+
+    Parameters
+    ----------
+    path : str
+        Data file.
+    offset : int
+        Start of the packed file in the data file.
+    length : int
+        Size of the packed file.
+
+    Returns
+    -------
+    memoryview
+        Zero-copy view of the packed file.
+    '''
+    path = os.path.abspath(path)
+    st = os.stat(path)
+    key = (st.st_ino, st.st_mtime_ns)
+    if path not in _maps or _maps[path][0] != key:
+        # not mapped yet, or the database was packed again since
+        with open(path, 'rb') as f:
+            _maps[path] = (key, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+    return memoryview(_maps[path][1])[offset:offset + length]
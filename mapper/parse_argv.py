@@ -1,8 +1,20 @@
 # -*- coding: utf-8 -*-
 import argparse
+import importlib.util
 import os
 
 
+def shard(value):
+    # i/N, with 1 <= i <= N
+    try:
+        i, n = (int(v) for v in value.split('/'))
+    except ValueError:
+        raise argparse.ArgumentTypeError('shard must be i/N, e.g. 3/50')
+    if not 1 <= i <= n:
+        raise argparse.ArgumentTypeError('shard i/N needs 1 <= i <= N')
+    return i, n
+
+
 def parse_commandline():
     '''
     Parse inputs from command line.
@@ -105,6 +117,10 @@ def parse_commandline():
     file_dest.add_argument('-a', "--append", dest="append", action='store_true',
                         help="Two or more calls to the program write are able to append results to the same output file.",
                         default=False)
+
+    file_dest.add_argument("--resume", dest="resume", action='store_true',
+                        help="Resume an interrupted run in the same output directory with the same options, \
+                            skipping the proteins already mapped.", default=False)
     
     # create default output directory
     parser.add_argument('-p', "--parallel", dest="parallel", action='store_true',
@@ -112,7 +128,7 @@ def parse_commandline():
                         help="Parallelize process")
 
     # interfaces database file
-    parser.add_argument("-j", "--jobs", dest="njobs", metavar="<int>",
+    parser.add_argument("-j", "--jobs", dest="njobs", metavar="<int>", type=int,
                         help="number of jobs to run in parallel")
     parser.set_defaults(njobs=1)
 
@@ -121,6 +137,28 @@ def parse_commandline():
                         help="Print progress.", default=False)
     parser.set_defaults(njobs=None)
 
+    # cache of parsed structural data of each job
+    parser.add_argument("--cache-size", dest="cache_size", metavar="<int>", type=int,
+                        help="memory in MB of each job to keep parsed structural data shared by \
+                            several transcripts. 0 disables it. Default is 256", default=256)
+
+    # map many proteins at once
+    parser.add_argument("--batch", dest="batch", action='store_true',
+                        help="map the variants of many proteins with a single join per batch \
+                            instead of one protein at a time.", default=False)
+    parser.add_argument("--batch-memory", dest="batch_memory", metavar="<int>", type=int,
+                        help="estimated memory in MB of the data of each batch. Default is 1024", default=1024)
+
+    # part of the run mapped by this node
+    parser.add_argument("--shard", dest="shard", metavar="<i/N>", type=shard,
+                        help="map only shard i (from 1 to N) of the proteins, balanced by estimated \
+                            cost, into <out>/shard_i_of_N. Combine the shards with mapper merge.", default=None)
+
+    # dry run
+    parser.add_argument("--plan", dest="plan", action='store_true',
+                        help="print the expected rows, bytes and peak memory of each protein \
+                            and in total, without mapping.", default=False)
+
     # force overwrite
     parser.add_argument('-l', "--location", dest="loc", action='store_true',
                         help="Map all variants and detect their location.", default=False)
@@ -133,6 +171,19 @@ def parse_commandline():
     # # in HDF5 format
     output_file.add_argument('-hdf', dest="hdf", action='store_true',
                          help="Write the mappedd data to an HDF5 file using HDFStore.", default=False)
+    # # as a partitioned Parquet dataset
+    output_file.add_argument('-parquet', dest="parquet", action='store_true',
+                         help="Write the mapped data to a Parquet dataset partitioned by Mapping_position.", default=False)
+    output_file.add_argument('--partition-by', nargs='+', dest="partition_by", metavar="<String>",
+                         choices=['chromosome', 'interaction_type'],
+                         help="additional partitions of the Parquet dataset: chromosome and/or interaction_type.", default=None)
+    # # compressed csv and setID files
+    output_file.add_argument('--compress', dest="compress", choices=['gzip', 'zstd'],
+                         help="compress the CSV and setID files in independent blocks (gzip or zstd).", default=None)
+    output_file.add_argument('--compress-level', dest="compress_level", metavar="<int>", type=int,
+                         help="compression level. Default is 6 for gzip and 3 for zstd.", default=None)
+    output_file.add_argument('--compress-threads', dest="compress_threads", metavar="<int>", type=int,
+                         help="threads compressing the output. Default is 4.", default=4)
     
     
     #parser.add_argument('-csv', dest="csv", action='store_true',
@@ -145,6 +196,12 @@ def parse_commandline():
 
     # store arguments into variable
     args = parser.parse_args()
+    # zstd compression needs the optional zstandard package
+    if args.compress == 'zstd' and importlib.util.find_spec('zstandard') is None:
+        parser.error('--compress zstd requires the zstandard package (pip install zstandard).')
+    # each shard writes to its own output directory
+    if args.shard is not None:
+        args.out = os.path.join(args.out, 'shard_{}_of_{}'.format(*args.shard))
 
     # clean up (recommended)
     del(parser)
@@ -0,0 +1,197 @@
+# -*- coding: utf-8 -*-
+
+# import necessary modules
+from .manifest import load_manifest
+
+# estimated memory in bytes of a parsed or joined row
+row_bytes = 512
+
+
+def db_cost(db_dir, id):
+    '''
+    Number of rows and size in bytes of the file of an ID in a database,
+    (0, 0) if it has none.
+    '''
+    entry = load_manifest(db_dir).get(id)
+    if entry is None:
+        return 0, 0
+    return int(entry['rows']), int(entry['size'])
+
+
+def task_costs(tasks, psdb, vardb):
+    '''
+    Estimate the cost of mapping each transcript to its protein from the
+    manifests of the databases, without reading any file.
+
+    Parameters
+    ----------
+    tasks : df
+        One row per transcript and protein to map ('transcriptID' and
+        'protID' columns).
+    psdb : str
+        Directory where to find interface database
+    vardb : str
+        Directory where to find positions database
+
+    Returns
+    -------
+    df
+        Tasks with the rows and bytes of the variants ('var_rows',
+        'var_bytes') and structural data ('struct_rows', 'struct_bytes')
+        they read and their cost, the rows read.
+    '''
+    var = {t: db_cost(vardb, t) for t in tasks['transcriptID'].unique()}
+    struct = {p: db_cost(psdb, p) for p in tasks['protID'].unique()}
+    tasks = tasks.assign(
+        var_rows=tasks['transcriptID'].map(lambda t: var[t][0]),
+        var_bytes=tasks['transcriptID'].map(lambda t: var[t][1]),
+        struct_rows=tasks['protID'].map(lambda p: struct[p][0]),
+        struct_bytes=tasks['protID'].map(lambda p: struct[p][1]))
+    tasks['cost'] = tasks['var_rows'] + tasks['struct_rows']
+    return tasks
+
+
+def largest_first(units, costs):
+    '''
+    Sort work units by decreasing cost, so that the largest ones start
+    first and small ones fill the workers at the end. Ties keep the input
+    order.
+
+    Parameters
+    ----------
+    units : list
+        Work units.
+    costs : list
+        Cost of each unit.
+
+    Returns
+    -------
+    list
+        Sorted units.
+    '''
+    order = sorted(range(len(units)), key=lambda i: -costs[i])
+    return [units[i] for i in order]
+
+
+def plan(tasks):
+    '''
+    Expected rows, bytes and peak memory of mapping each protein.
+
+    The structural data of a protein is parsed once and the variants of
+    its transcripts one after another, so the peak memory of a protein is
+    that of its structural data and its largest transcript.
+
+    Parameters
+    ----------
+    tasks : df
+        Tasks with their costs, as returned by task_costs.
+
+    Returns
+    -------
+    df
+        One row per protein, largest first, and a last row with the
+        totals (the peak memory of the total is that of the largest
+        protein).
+    '''
+    proteins = tasks.groupby('protID', sort=False).agg(
+        transcripts=('transcriptID', 'nunique'),
+        var_rows=('var_rows', 'sum'), var_bytes=('var_bytes', 'sum'),
+        struct_rows=('struct_rows', 'first'), struct_bytes=('struct_bytes', 'first'),
+        max_var_rows=('var_rows', 'max'))
+    proteins['rows'] = proteins['var_rows'] + proteins['struct_rows']
+    proteins['bytes'] = proteins['var_bytes'] + proteins['struct_bytes']
+    proteins['peak_MB'] = (proteins['struct_rows'] + proteins['max_var_rows']) * row_bytes / 1024 ** 2
+    proteins = proteins.sort_values('rows', ascending=False, kind='mergesort')
+    proteins = proteins[['transcripts', 'var_rows', 'struct_rows', 'rows', 'bytes', 'peak_MB']]
+    total = proteins.sum()
+    total['peak_MB'] = proteins['peak_MB'].max() if len(proteins) else 0
+    proteins.loc['Total'] = total
+    counts = ['transcripts', 'var_rows', 'struct_rows', 'rows', 'bytes']
+    proteins = proteins.astype({c: 'int64' for c in counts})
+    return proteins.rename_axis('Protein').reset_index()
+
+
+def pack_units(units, costs, njobs, groups=None, per_worker=4):
+    '''
+    Pack work units into batches of similar cost, so that costly units
+    run alone while cheap ones share a task and its dispatch overhead.
+
+    Units of the same group (e.g. the transcripts of a protein) always
+    go to the same batch, so that they run in the same worker and share
+    its cache of parsed structural data. The target cost of a batch gives
+    about per_worker batches to each worker. Groups at least that costly
+    are batches on their own and the rest are packed, largest first,
+    until a batch reaches the target.
+
+    Parameters
+    ----------
+    units : list
+        Work units.
+    costs : list
+        Cost of each unit.
+    njobs : int
+        Number of workers.
+    groups : list
+        Group of each unit, each unit on its own if None.
+    per_worker : int
+        Batches per worker.
+
+    Returns
+    -------
+    list
+        Batches (lists of units), largest first.
+    '''
+    members = {}
+    for i, g in enumerate(range(len(units)) if groups is None else groups):
+        members.setdefault(g, []).append(i)
+    members = list(members.values())
+    group_costs = [sum(costs[i] for i in m) for m in members]
+    target = max(sum(costs) / (max(njobs or 1, 1) * per_worker), 1)
+    batches, sizes, current, size = [], [], [], 0
+    for g in sorted(range(len(members)), key=lambda g: -group_costs[g]):
+        group = [units[i] for i in members[g]]
+        if group_costs[g] >= target:
+            batches.append(group)
+            sizes.append(group_costs[g])
+            continue
+        current.extend(group)
+        size += group_costs[g]
+        if size >= target:
+            batches.append(current)
+            sizes.append(size)
+            current, size = [], 0
+    if current:
+        batches.append(current)
+        sizes.append(size)
+    return largest_first(batches, sizes)
+
+
+def shard_assignment(keys, costs, nshards):
+    '''
+    Assign work units to shards balancing their cost (longest processing
+    time first): units are taken by decreasing cost, ties by key, and
+    each one goes to the least loaded shard. The assignment only depends
+    on the units and their costs, not on their order, so that every node
+    of a cluster computes the same one.
+
+    Parameters
+    ----------
+    keys : list
+        Keys of the work units.
+    costs : list
+        Cost of each unit.
+    nshards : int
+        Number of shards.
+
+    Returns
+    -------
+    dict
+        Key -> shard, from 1 to nshards.
+    '''
+    loads = [0] * nshards
+    assignment = {}
+    for cost, key in sorted(zip(costs, keys), key=lambda u: (-u[0], str(u[1]))):
+        shard = loads.index(min(loads))
+        loads[shard] += cost
+        assignment[key] = shard + 1
+    return assignment
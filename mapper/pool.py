@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+
+# import necessary modules
+import multiprocessing as mp
+
+from .batch import map_chunk
+from .consequences import load_terms
+from .frame_cache import get_frame_cache
+from .id_mapping import load_id_mapping
+from .logger import get_logger
+from .manifest import load_manifest
+from .mapper_wrapper import wrapper
+from .writer import mark_done, set_queue
+
+# options of the run shared by every task of this worker
+_state = None
+
+
+def preload(state):
+    '''
+    Load the read-only tables of a run in this process: the manifests of
+    both databases, the ID mapping and the consequence terms. Workers
+    forked afterwards share them copy-on-write.
+    '''
+    load_manifest(state['psdb'])
+    load_manifest(state['vardb'])
+    load_terms(state['vardb'])
+    if state['dict_geneprot'] is not None:
+        load_id_mapping(state['dict_geneprot'])
+
+
+def init_worker(state):
+    '''
+    Initialize a worker once: configure logging, connect to the output
+    writer and load the read-only tables and the structural data cache,
+    so that tasks only carry IDs.
+
+    Parameters
+    ----------
+    state : dict
+        Options of the run: psdb, vardb, out_dir, pident, evalue,
+        isoform, consequence, loc, index_file, dict_geneprot, csv, hdf,
+        parquet, cache_size and queue.
+    '''
+    global _state
+    _state = state
+    get_logger('worker', state['out_dir'])
+    set_queue(state['queue'])
+    preload(state)
+    if state['cache_size']:
+        get_frame_cache(state['cache_size'])
+
+
+def unit_key(unit):
+    '''
+    Key of a unit of map_ids in the journal: input ID, transcript and
+    protein (empty for IDs that are only located).
+    '''
+    id, varid, ids = unit
+    if not ids:
+        return (id, '', '')
+    return (id, ids['transcriptID'][0], ids['protID'][0])
+
+
+def map_ids(unit):
+    '''
+    Map an input ID, given as (ID, variant ids or None, translated IDs).
+    '''
+    id, varid, ids = unit
+    s = _state
+    usage = wrapper(id, s['psdb'], s['vardb'], s['out_dir'], s['pident'], s['evalue'],
+                    s['isoform'], s['consequence'], s['loc'], s['index_file'],
+                    s['dict_geneprot'], varid, s['csv'], s['hdf'], ids,
+                    s['cache_size'], s['queue'], s['parquet'])
+    mark_done([unit_key(unit)])
+    return usage
+
+
+def map_units(units):
+    '''
+    Map a batch of units of map_ids one after another, returning the peak
+    memory of the worker and the cache counters of the whole batch.
+    '''
+    usage = [map_ids(unit) for unit in units]
+    total = {'peak_rss': max(u['peak_rss'] for u in usage)}
+    for k in ['hits', 'misses', 'evictions']:
+        if k in usage[0]:
+            total[k] = sum(u[k] for u in usage)
+    return total
+
+
+def map_batch(chunk):
+    '''
+    Map a chunk of tasks of the batch mode.
+    '''
+    s = _state
+    usage = map_chunk(chunk, s['psdb'], s['vardb'], s['out_dir'], s['pident'], s['evalue'],
+                      s['isoform'], s['consequence'], s['loc'], s['csv'], s['hdf'],
+                      s['queue'], s['parquet'])
+    mark_done(zip(chunk['inputID'], chunk['transcriptID'], chunk['protID']))
+    return usage
+
+
+def run_pool(jobs, state, njobs, writer):
+    '''
+    Run task functions over work units on a pool of initialized workers,
+    starting the output writer once they are forked.
+
+    Where available, workers are forked after the read-only tables are
+    loaded in the main process, so that they share them copy-on-write
+    instead of receiving them with every task, and before the writer
+    starts its threads. Units are dispatched one at a time in the given
+    order.
+
+    Parameters
+    ----------
+    jobs : list
+        Task function (map_ids, map_units or map_batch) and work units of
+        each step, run one after another on the same workers.
+    state : dict
+        Options of the run, see init_worker.
+    njobs : int
+        Number of workers, counted from the number of CPUs if negative as
+        in joblib. With 1 or None, units are mapped in this process.
+    writer : OutputWriter
+        Writer of the outputs, not started yet.
+
+    Returns
+    -------
+    list
+        Results of every unit, in completion order.
+    '''
+    nunits = max([len(units) for _, units in jobs] + [0])
+    if njobs is not None and njobs < 0:
+        njobs = max(mp.cpu_count() + 1 + njobs, 1)
+    if nunits == 0 or njobs is None or njobs == 1:
+        writer.start()
+        if nunits:
+            init_worker(state)
+        return [func(unit) for func, units in jobs for unit in units]
+    method = 'fork' if 'fork' in mp.get_all_start_methods() else 'spawn'
+    if method == 'fork':
+        preload(state)
+    with mp.get_context(method).Pool(min(njobs, nunits), initializer=init_worker,
+                                     initargs=(state,)) as pool:
+        writer.start()
+        return [r for func, units in jobs
+                for r in pool.imap_unordered(func, units, chunksize=1)]
@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+import pandas as pd
+
+
+def position_keys(positions):
+    '''
+    Integer keys of protein positions, -1 for positions that are not a
+    single number (e.g. '-' for noncoding variants).
+    '''
+    keys = pd.to_numeric(positions, errors='coerce')
+    return keys.fillna(-1).to_numpy(dtype=np.int64)
+
+
+def position_join(left, right, on='Protein_position', group=None):
+    '''
+    Inner join of variants and structural rows on integer protein
+    positions.
+
+    The rows of each position are a contiguous range of the structural
+    data sorted by position, so every variant is matched with two binary
+    searches and no position is hashed.
+
+    Parameters
+    ----------
+    left : df
+        Variants, with positions as numbers or strings.
+    right : df
+        Structural data, sorted by integer position.
+    on : str
+        Column with the positions.
+    group : str
+        Column of both frames with an integer code of the protein, to join
+        many proteins at once. right must then be sorted by group and
+        position.
+
+    Returns
+    -------
+    df
+        One row per variant and structural row at the same position, with
+        the index and columns of left followed by the columns of right
+        but the position and group.
+    array
+        Boolean mask of the variants matching any structural row.
+    '''
+    keys = position_keys(left[on])
+    index = right[on].to_numpy()
+    if group is not None:
+        # positions are offset by their protein, keys of unknown
+        # positions stay negative
+        keys = np.where(keys < 0, -1, keys + (left[group].to_numpy(np.int64) << 32))
+        index = index + (right[group].to_numpy(np.int64) << 32)
+    lo = np.searchsorted(index, keys, side='left')
+    hi = np.searchsorted(index, keys, side='right')
+    counts = hi - lo
+    offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    joined = left.iloc[np.repeat(np.arange(len(left)), counts)]
+    matched = right.drop(columns=[on] if group is None else [on, group]).iloc[np.repeat(lo, counts) + offsets]
+    matched.index = joined.index
+    return pd.concat([joined, matched], axis=1), counts > 0
@@ -0,0 +1,28 @@
+# -*- coding: utf-8 -*-
+
+
+def select_positions(df, var_ids):
+    '''
+    Select annotated positions by variant id.
+
+    Parameters
+    ----------
+    df : df
+        Parsed variants of a transcript.
+    var_ids : str or list
+        One or more ids matched against 'Uploaded_variation' and each of
+        the comma separated ids of 'Existing_variation'.
+
+    Returns
+    -------
+    df
+        Positions with any of the input ids.
+    '''
+    if isinstance(var_ids, str):
+        var_ids = [var_ids]
+    var_ids = set(str(v) for v in var_ids)
+    selected = df.Uploaded_variation.astype(str).isin(var_ids)
+    if 'Existing_variation' in df.columns:
+        existing = df.Existing_variation.astype(str).str.split(',').explode()
+        selected |= existing.isin(var_ids).groupby(level=0).any()
+    return df[selected]
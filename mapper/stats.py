@@ -1,10 +1,21 @@
 # coding: utf-8
 import os
+import sys
+import resource
 import pandas as pd
 from tabulate import tabulate
 from .run_subprocess import call_subprocess
 
 
+def peak_rss():
+    '''
+    Peak resident set size of this process in MB.
+    '''
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # bytes on macOS, kilobytes elsewhere
+    return peak / 1024 ** 2 if sys.platform == 'darwin' else peak / 1024
+
+
 def stats(var_statsfile, int_statsfile, mapped_infofile, out_dir):
     # # PDBmapper stats
     # var_stats = pd.read_csv(var_statsfile, sep=" |\t", engine='python')
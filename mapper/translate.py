@@ -1,12 +1,8 @@
 # -*- coding: utf-8 -*-
 
 # import necessary modules
-import sys
-import os
-import re
-import pandas as pd
-import numpy as np
-from .run_subprocess import call_subprocess
+from .id_mapping import load_id_mapping
+from .input_isfile import isfile
 from .logger import get_logger
 
 
@@ -26,47 +22,91 @@ def translate(id, log_dir,dict_geneprot=None, isoform_filter=None):
     '''
     # set logger
     logger = get_logger('translate_ensembl', log_dir)
-    # read reference file of ensembl ids
-    dirname = os.path.dirname(__file__)
-    # rel_path =
-    #if dict_geneprot is None : 
-    #dict_geneprot = os.path.join(dirname, "data/biomart_GRCh38p13_feb2021.dat")
+    # indexed reference file of ensembl ids, loaded once per process
+    mapping = load_id_mapping(dict_geneprot)
+    df = mapping.lookup(id)
+    # avoid possible errors
+    if not df.empty:
+        # filter by principal isoform if any filter
+        if isoform_filter is not None:
+            df = df[df['isoform'].isin(isoform_filter)]
+            if df.empty:
+                logger.error(
+                    'Input isoform filter ' + str(isoform_filter) + ' does not exist. Please check if you misspelt it.')
+                raise IOError()
+        protID = df['protID'].tolist()
+        geneID = df['geneID'].tolist()
+        transcriptID = df['transcriptID'].tolist()
+        results = {'protID': protID, 'geneID': geneID, 'transcriptID': transcriptID}
+        if isoform_filter is not None:
+            APPRIS = df['isoform'].tolist()
+            results['APPRIS'] = APPRIS
 
-    with open(dict_geneprot) as f:
-        # get col names
-        cols = f.readline().rstrip().split(',')
-        # command line for grep (very fast)
-        cmd = 'grep -w \'' + id + '\' ' + dict_geneprot
-        # call shell process
-        out, err = call_subprocess(cmd)
-        line = out.decode('utf-8')
-        # avoid possible errors
-        if out != b'':
-            list_ids = line.split('\n')[:-1]
-            df = pd.DataFrame(np.array(list_ids), columns=list("l"))
-            #df[['isoform', 'geneID', 'transcriptID', 'protID', 'UniprotID']
-            #   ] = df['l'].str.split(',', expand=True)
-            df[cols
-               ] = df['l'].str.split(',', expand=True)
-            # filter by principal isoform if any filter
-            protID = df['protID'].tolist()
-            geneID = df['geneID'].tolist()
-            transcriptID = df['transcriptID'].tolist()
-            results = {'protID': protID, 'geneID': geneID, 'transcriptID': transcriptID}
-            if isoform_filter is not None:
-                df = df[df['isoform'].isin(isoform_filter)]
-                if df.empty:
-                    logger.error(
-                        'Input isoform filter ' + isoform_filter + ' does not exist. Please check if you misspelt it.')
-                    raise IOError()
-                else : 
-                    APPRIS = df['isoform'].tolist()
-                    results['APPRIS'] = APPRIS
-                  
-            return results
+        return results
 
+    else:
+        logger.error(
+            'Input Ensembl ID is neither a protein nor a gene.')
+        raise IOError
+
+
+def translate_many(ids, log_dir, dict_geneprot=None, isoform_filter=None):
+    '''
+    gene-transcript-protein id translator for a whole list of ids.
+
+    Parameters
+    ----------
+    ids : list
+        Input IDs corresponding to genes, transcripts or proteins, or files
+        containing a list of them (one per line).
+
+    Returns
+    -------
+    df
+        One row per input ID and matching gene, transcript, protein and
+        APPRIS isoform.
+    list
+        Input IDs without translation.
+    list
+        Input IDs whose translations are all removed by the isoform filter.
+    '''
+    # set logger
+    logger = get_logger('translate_ensembl', log_dir)
+    # read ids from files, keeping input order and removing duplicates
+    input_ids = []
+    for i in ids:
+        if isfile(i) == 'yes':
+            with open(i) as list_ids:
+                input_ids.extend(line.replace('\n', '') for line in list_ids)
         else:
+            input_ids.append(i)
+    input_ids = list(dict.fromkeys(input_ids))
+    # binary search of input ids in the indexed reference file of ensembl ids
+    mapping = load_id_mapping(dict_geneprot)
+    matches, rows = mapping.lookup_many(input_ids)
+    df = mapping.frame(rows)
+    df.insert(0, 'inputID', [input_ids[m] for m in matches])
+    # filter by principal isoform if any filter
+    if isoform_filter is not None:
+        if 'isoform' not in df.columns:
             logger.error(
-                'Input Ensembl ID is neither a protein nor a gene.')
-            raise IOError
-            
+                'Input isoform filter ' + str(isoform_filter) + ' cannot be applied. The ID mapping file has no isoform column.')
+            raise IOError()
+        df = df[df['isoform'].isin(isoform_filter)]
+        df['APPRIS'] = df['isoform']
+    else:
+        df['APPRIS'] = None
+    df = df[['inputID', 'geneID', 'transcriptID', 'protID', 'APPRIS']]
+    # report every id without translation at once, apart from the ids
+    # that translate but to no isoform of the filter
+    matched = set(input_ids[m] for m in matches)
+    resolved = set(df['inputID'])
+    unresolved = [i for i in input_ids if i not in matched]
+    filtered = [i for i in input_ids if i in matched and i not in resolved]
+    if unresolved:
+        logger.error('Warning: {} input IDs have no matching ensembl ids: {}'.format(
+            len(unresolved), ', '.join(unresolved)))
+    if filtered:
+        logger.error('Warning: {} input IDs have no isoform in {}: {}'.format(
+            len(filtered), ', '.join(isoform_filter), ', '.join(filtered)))
+    return df, unresolved, filtered
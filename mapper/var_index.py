@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+
+# import necessary modules
+import os
+import numpy as np
+import pandas as pd
+from .input_isfile import isfile
+
+# variant indexes already loaded by this process, keyed by varDB directory
+_variant_indexes = {}
+
+
+class VariantIndex:
+    '''
+    Sorted index of variant ids of a variants database.
+
+    makevariantsdb writes ``variants.index.sorted`` with one line per
+    uploaded or existing variation id, its gene and its transcript, sorted
+    by variant id. Databases created before it existed are indexed from
+    ``variants.index`` (uploaded variation ids only).
+    '''
+
+    def __init__(self, vardb, index_file=None):
+        sorted_file = os.path.join(vardb, 'variants.index.sorted')
+        if os.path.isfile(sorted_file):
+            df = pd.read_csv(sorted_file, sep=' ', header=None,
+                             names=['varID', 'Gene', 'Feature'],
+                             dtype=str, keep_default_na=False)
+        else:
+            df = pd.read_csv(index_file, sep=' ', dtype=str,
+                             keep_default_na=False)
+            df = df.rename(columns={'Uploaded_variation': 'varID'})
+            df = df[['varID', 'Gene', 'Feature']].drop_duplicates()
+            df = df.sort_values('varID', kind='mergesort')
+        self.keys = df['varID'].values.astype(str)
+        self.df = df.reset_index(drop=True)
+        # transcripts sorted by transcript and by gene, built when needed
+        self.features = None
+        self.genes = None
+
+    def resolve(self, varids):
+        '''
+        Binary search of many variant ids at once.
+
+        Parameters
+        ----------
+        varids : list
+            Variant ids.
+
+        Returns
+        -------
+        df
+            One row per input variant id and transcript it falls in.
+        list
+            Input variant ids not found in the index.
+        '''
+        varids = np.array(varids, dtype=str)
+        lo = np.searchsorted(self.keys, varids, side='left')
+        hi = np.searchsorted(self.keys, varids, side='right')
+        counts = hi - lo
+        offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        df = self.df.iloc[np.repeat(lo, counts) + offsets].reset_index(drop=True)
+        df['varID'] = np.repeat(varids, counts)
+        return df, varids[counts == 0].tolist()
+
+    def transcripts(self, id):
+        '''
+        Transcripts of the variants database an ID stands for, found by
+        binary search.
+
+        Parameters
+        ----------
+        id : str
+            Transcript, gene or variant id.
+
+        Returns
+        -------
+        list
+            The transcript itself, the transcripts of the gene or those
+            the variant falls in. Empty if the ID is not in the index.
+        '''
+        if self.features is None:
+            pairs = self.df[['Gene', 'Feature']].drop_duplicates()
+            self.features = np.unique(pairs['Feature'].values.astype(str))
+            pairs = pairs.sort_values('Gene', kind='mergesort')
+            self.genes = (pairs['Gene'].values.astype(str), pairs['Feature'].values.astype(str))
+        i = np.searchsorted(self.features, id)
+        if i < len(self.features) and self.features[i] == id:
+            return [id]
+        genes, features = self.genes
+        lo, hi = np.searchsorted(genes, id, side='left'), np.searchsorted(genes, id, side='right')
+        if hi > lo:
+            return list(dict.fromkeys(features[lo:hi]))
+        located, _ = self.resolve([id])
+        return list(dict.fromkeys(located['Feature']))
+
+
+def load_variant_index(vardb, index_file=None):
+    '''
+    Load the variant index of a variants database once per process.
+
+    Parameters
+    ----------
+    vardb : str
+        Directory of the variants database.
+    index_file : str
+        Path to ``variants.index``, used if there is no sorted index.
+
+    Returns
+    -------
+    VariantIndex
+        Sorted variant index.
+    '''
+    path = os.path.abspath(vardb)
+    if path not in _variant_indexes:
+        _variant_indexes[path] = VariantIndex(vardb, index_file)
+    return _variant_indexes[path]
+
+
+def read_varids(varids):
+    '''
+    Variant ids given in the command line or in files (one per line).
+    '''
+    ids = []
+    for v in varids:
+        if isfile(v) == 'yes':
+            with open(v) as list_varids:
+                ids.extend(line.replace('\n', '') for line in list_varids)
+        else:
+            ids.append(v)
+    return [i for i in dict.fromkeys(ids) if i != '']
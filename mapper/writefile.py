@@ -1,15 +1,30 @@
 import os
 import pandas as pd
+from .writer import append_csv, append_parquet
 #import gzip
-def writefile(protid, out_dir, pident, isoform, consequence, df, maptype, csv= False, hdf = False):
+
+# columns of the variants database only used to map the positions, and
+# columns identifying each protein and transcript in batch mode
+internal_columns = ['Is_coding', 'Consequence_mask', '_task', '_protein', '_accession']
+
+def text_positions(df):
+    # positions that are not a number are written as in VEP ('-')
+    if 'Protein_position' in df.columns and isinstance(df['Protein_position'].dtype, pd.Int32Dtype):
+        positions = df['Protein_position']
+        df = df.assign(Protein_position=positions.astype(object).where(positions.notna(), '-'))
+    return df
+
+def writefile(protid, out_dir, pident, isoform, consequence, df, maptype, csv= False, hdf = False, parquet = False):
     if df.empty is not True: 
+        df = df.drop(columns=internal_columns, errors='ignore')
         if csv is True: 
             out_csv = os.path.join(out_dir, 'csv')
-            with open(os.path.join(out_csv,(maptype + '_pident' + str(pident) + '_isoform_' +
-                    '_'.join(isoform) + '_consequence_' + '_'.join(consequence) + '.csv')), 'a') as f:
-                df.to_csv(f, sep=',', index=False,
-                                            header=f.tell() == 0)
-                f.close()
+            append_csv(os.path.join(out_csv,(maptype + '_pident' + str(pident) + '_isoform_' +
+                    '_'.join(isoform) + '_consequence_' + '_'.join(consequence) + '.csv')), text_positions(df))
+        if parquet is True:
+            # one dataset for every map type, partitioned by Mapping_position
+            append_parquet(os.path.join(out_dir, 'parquet', ('pident' + str(pident) + '_isoform_' +
+                    '_'.join(isoform) + '_consequence_' + '_'.join(consequence))), df)
         if hdf is True: 
             out_hdf = os.path.join(out_dir, 'hdf5', maptype)
             if not os.path.exists(out_hdf):
@@ -17,5 +32,7 @@ def writefile(protid, out_dir, pident, isoform, consequence, df, maptype, csv= F
             import vaex
             fn = os.path.join(out_hdf,( maptype + '_pident' + str(pident) + '_isoform_' +
                     '_'.join(isoform) + '_consequence_' + '_'.join(consequence) + '_' + protid + '.hdf5'))
+            # categorical columns are exported as plain strings
+            df = text_positions(df.astype({c: object for c in df.select_dtypes('category').columns}))
             vaex_df = vaex.from_pandas(df, copy_index=False)
             vaex_df.export_hdf5(fn)
\ No newline at end of file
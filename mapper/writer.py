@@ -0,0 +1,442 @@
+# -*- coding: utf-8 -*-
+
+# import necessary modules
+import os
+import time
+import zlib
+import itertools
+import threading
+import multiprocessing as mp
+from collections import deque
+from urllib.parse import quote
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pandas as pd
+
+from .db_parser import structural_dtypes, variants_dtypes
+
+# queue of the output writer of this process, if any
+_queue = None
+
+# writes of Parquet files by this process, numbered
+_writes = itertools.count()
+
+# columns of the Parquet dataset partitioning the rows, besides the map type
+partition_columns = {'chromosome': 'Chromosome', 'interaction_type': 'Interaction_type'}
+
+# rows per row group of the Parquet files
+row_group_rows = 128 * 1024
+
+# directory name of the rows of a partition whose value is missing, as
+# read by pyarrow and Spark
+hive_null = '__HIVE_DEFAULT_PARTITION__'
+
+# extension of the compressed csv and setID files
+compressed_extensions = {'gzip': '.gz', 'zstd': '.zst'}
+
+
+def set_queue(queue):
+    '''
+    Send the results of this process to an output writer. With None,
+    results are appended to the output files directly.
+    '''
+    global _queue
+    _queue = queue
+
+
+def append_csv(path, df, sep=','):
+    '''
+    Append a data frame to a csv file, through the output writer if this
+    process has one. The header is only written to empty files.
+
+    Parameters
+    ----------
+    path : str
+        Output file.
+    df : df
+        Rows to append.
+    sep : str
+        Field delimiter.
+    '''
+    if _queue is None:
+        with open(path, 'a') as f:
+            df.to_csv(f, sep=sep, index=False, header=f.tell() == 0)
+        return
+    header = sep.join(str(c) for c in df.columns) + '\n'
+    _queue.put(('csv', path, (header, df.to_csv(sep=sep, index=False, header=False))))
+
+
+def new_token():
+    '''
+    Unique name of a write of Parquet files: the process, the time and
+    the number of the write in the process.
+    '''
+    return '{}-{}-{}'.format(os.getpid(), int(time.time() * 1e6), next(_writes))
+
+
+def append_parquet(path, df):
+    '''
+    Add rows to a Parquet dataset, through the output writer if this
+    process has one.
+
+    Parameters
+    ----------
+    path : str
+        Dataset directory.
+    df : df
+        Rows to add, with their map type in 'Mapping_position'.
+    '''
+    if _queue is None:
+        write_parquet(path, [df], ['Mapping_position'], new_token())
+        return
+    _queue.put(('parquet', path, df))
+
+
+def mark_done(units):
+    '''
+    Report work units whose rows were all sent to the output writer, if
+    this process has one.
+
+    Parameters
+    ----------
+    units : list
+        Keys of the completed units.
+    '''
+    if _queue is not None:
+        _queue.put(('done', None, [list(u) for u in units]))
+
+
+def compress_block(data, compression, level=None):
+    '''
+    Compress a block of text as an independent gzip member or zstd frame.
+    Members and frames written one after another form a valid file that
+    gzip, zcat or zstd read as a whole.
+
+    Parameters
+    ----------
+    data : str
+        Block of text.
+    compression : str
+        'gzip' or 'zstd'.
+    level : int
+        Compression level, the default of the format if None.
+
+    Returns
+    -------
+    bytes
+        Compressed block.
+    '''
+    data = data.encode('utf-8')
+    if compression == 'gzip':
+        c = zlib.compressobj(6 if level is None else level, zlib.DEFLATED, 31)
+        return c.compress(data) + c.flush()
+    import zstandard
+    return zstandard.ZstdCompressor(level=3 if level is None else level).compress(data)
+
+
+def arrow_type(column):
+    '''
+    Arrow type of an output column. Columns typed in the databases keep
+    their type (positions of the protein are integers, null for noncoding
+    variants) and any other column is a string, so that every file of a
+    dataset has the same type for a column.
+    '''
+    import pyarrow as pa
+    dtype = {**variants_dtypes, **structural_dtypes}.get(column)
+    if dtype is None:
+        return pa.string()
+    if dtype in (np.int8, np.int32, np.int64, np.float64):
+        return pa.from_numpy_dtype(dtype)
+    return pa.string()
+
+
+def to_arrow(df):
+    '''
+    Arrow table of a data frame of positions with the types of arrow_type.
+    '''
+    import pyarrow as pa
+    arrays, fields = [], []
+    for c in df.columns:
+        t = arrow_type(c)
+        s = df[c]
+        if pa.types.is_string(t):
+            s = s.astype(object).where(s.notna(), None)
+            s = s.map(lambda v: v if v is None or isinstance(v, str) else
+                      str(int(v)) if isinstance(v, float) and v.is_integer() else str(v))
+        arrays.append(pa.array(s, type=t, from_pandas=True))
+        fields.append(pa.field(c, t))
+    return pa.Table.from_arrays(arrays, schema=pa.schema(fields))
+
+
+def write_parquet(path, frames, partitions, token):
+    '''
+    Write frames of positions as new files of a Parquet dataset
+    partitioned hive-style by the given columns. Rows are sorted by
+    protein and variant so that the statistics of each row group allow
+    readers to skip most of them.
+
+    Parameters
+    ----------
+    path : str
+        Dataset directory.
+    frames : list
+        Data frames of positions.
+    partitions : list
+        Columns partitioning the dataset.
+    token : str
+        Unique name of this write, part of the name of the new files.
+
+    Returns
+    -------
+    Schema
+        Arrow schema of the rows written.
+    list
+        Files written.
+    '''
+    import pyarrow.parquet as pq
+    df = pd.concat(frames, ignore_index=True, sort=False)
+    if 'Chromosome' in partitions:
+        df['Chromosome'] = df['Location'].astype(str).str.split(':', n=1).str[0]
+    for c in partitions:
+        if c not in df.columns:
+            df[c] = None
+    order = [c for c in ['Protein_accession', 'Uploaded_variation'] if c in df.columns]
+    if order:
+        df = df.sort_values(order, kind='mergesort', na_position='last')
+    table = to_arrow(df)
+    # partition columns are in the directory names, not in the files
+    data = table.drop(partitions)
+    # hive-style directory of each row, from the values as written
+    segments = pd.DataFrame({c: ['{}={}'.format(c, hive_null if v is None else quote(str(v), safe=''))
+                                 for v in table.column(c).to_pylist()] for c in partitions})
+    files = []
+    for i, (directory, rows) in enumerate(segments.groupby(partitions, sort=False).indices.items()):
+        directory = os.path.join(path, *(directory if isinstance(directory, tuple) else (directory,)))
+        os.makedirs(directory, exist_ok=True)
+        f = os.path.join(directory, 'part-{}-{}.parquet'.format(token, i))
+        writer = pq.ParquetWriter(f, data.schema)
+        writer.write_table(data.take(rows), row_group_size=row_group_rows)
+        writer.close()
+        files.append(f)
+    return table.schema, files
+
+
+class OutputWriter:
+    '''
+    Single writer of the csv and Parquet outputs shared by every worker.
+
+    Workers put the rows of each output, already formatted for csv files,
+    in a bounded queue. A thread of the main process buffers them by
+    output and writes each buffer with one sequential write once it is
+    large enough, writing the header of a csv file only once, when it is
+    empty. Buffered Parquet rows are written as new files of a dataset
+    partitioned by map type (and optionally chromosome and interaction
+    type), whose common schema is saved in '_common_metadata' at the end.
+    The thread is started by start(), once the workers are forked.
+
+    With compression, csv files get a '.gz' or '.zst' extension and each
+    block of rows of a file is compressed independently on a pool of
+    threads while the next ones are buffered. Blocks are written in order.
+
+    With a journal, workers report each completed work unit after its
+    rows, and every write of the outputs (at least every
+    checkpoint_seconds) is recorded with the units it completes.
+    '''
+
+    def __init__(self, max_messages=256, buffer_bytes=8 * 1024 ** 2, partition_by=None,
+                 compression=None, level=None, threads=4, block_bytes=1024 ** 2,
+                 journal=None, checkpoint_seconds=60):
+        self.manager = mp.Manager()
+        self.queue = self.manager.Queue(max_messages)
+        self.buffer_bytes = buffer_bytes
+        self.compression = compression
+        self.level = level
+        self.block_bytes = block_bytes
+        self.threads = threads
+        self.pool = None
+        self.max_pending = 2 * threads
+        self.sizes = {}
+        self.pending = {}
+        self.partitions = ['Mapping_position'] + [
+            partition_columns[p] for p in (partition_by or [])]
+        self.token = new_token()
+        self.buffers = {}
+        self.datasets = {}
+        self.schemas = {}
+        self.nbytes = 0
+        self.nfiles = 0
+        self.written = {}
+        self.journal = journal
+        self.checkpoint_seconds = checkpoint_seconds
+        self.last_flush = time.time()
+        self.done = []
+        self.committed = {}
+        self.error = None
+        if journal is not None:
+            journal.start(self.token)
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def start(self):
+        '''
+        Start the writer thread and the compression threads. Workers must
+        be forked before: a child forked while a thread of its parent
+        holds a lock can block on it forever.
+        '''
+        if self.compression is not None:
+            self.pool = ThreadPoolExecutor(self.threads)
+        self.thread.start()
+
+    def run(self):
+        while True:
+            message = self.queue.get()
+            if message is None:
+                break
+            if self.error is not None:
+                # keep draining the queue so that workers are not blocked
+                continue
+            try:
+                self.handle(message)
+            except Exception as e:
+                self.error = e
+        if self.error is None:
+            try:
+                self.flush()
+            except Exception as e:
+                self.error = e
+
+    def handle(self, message):
+        '''
+        Buffer a message of the workers, writing the buffers if they are
+        large enough.
+        '''
+        kind, path, payload = message
+        if kind == 'csv':
+            header, rows = payload
+            if self.compression is not None:
+                path += compressed_extensions[self.compression]
+            if path not in self.buffers:
+                # files from previous runs (--append) already have a header
+                empty = not os.path.exists(path) or os.path.getsize(path) == 0
+                self.buffers[path] = [header] if empty else []
+                self.sizes[path] = len(self.buffers[path][0]) if empty else 0
+                self.pending[path] = deque()
+                self.written.setdefault(path, 0)
+                self.committed[path] = 0 if empty else os.path.getsize(path)
+            self.buffers[path].append(rows)
+            self.sizes[path] += len(rows)
+            self.nbytes += len(rows)
+            if self.compression is not None and self.sizes[path] >= self.block_bytes:
+                self.submit(path)
+                self.write_done(path)
+        elif kind == 'parquet':
+            self.datasets.setdefault(path, []).append(payload)
+            self.nbytes += int(payload.memory_usage(index=False).sum())
+        else:
+            # work units whose rows were all sent before
+            self.done.extend(payload)
+        if self.nbytes >= self.buffer_bytes or (
+                self.journal is not None and time.time() - self.last_flush > self.checkpoint_seconds):
+            self.flush()
+
+    def submit(self, path):
+        '''
+        Compress the buffered rows of a file on the thread pool.
+        '''
+        data = ''.join(self.buffers[path])
+        self.buffers[path].clear()
+        self.nbytes -= self.sizes[path]
+        self.sizes[path] = 0
+        self.pending[path].append(
+            self.pool.submit(compress_block, data, self.compression, self.level))
+
+    def write_done(self, path, wait=False):
+        '''
+        Append the compressed blocks of a file that are ready, in order,
+        waiting for the oldest ones if too many are queued.
+        '''
+        pending = self.pending[path]
+        ready = lambda: wait or pending[0].done() or len(pending) > self.max_pending
+        if not pending or not ready():
+            return
+        with open(path, 'ab') as f:
+            while pending and ready():
+                block = pending.popleft().result()
+                f.write(block)
+                self.written[path] += len(block)
+
+    def flush(self):
+        '''
+        Write the buffered rows of every output, recording the write in
+        the journal if any.
+        '''
+        self.last_flush = time.time()
+        if self.journal is not None:
+            if not (self.done or any(self.buffers.values()) or
+                    any(self.pending.values()) or any(self.datasets.values())):
+                return
+            self.journal.write({'type': 'begin', 'offsets': self.committed,
+                                'datasets': list(self.datasets)})
+        files = []
+        for path, chunks in self.buffers.items():
+            if self.compression is not None:
+                if chunks:
+                    self.submit(path)
+                self.write_done(path, wait=True)
+            elif chunks:
+                data = ''.join(chunks)
+                with open(path, 'a') as f:
+                    f.write(data)
+                self.written[path] += len(data)
+                chunks.clear()
+                self.sizes[path] = 0
+        for path, frames in self.datasets.items():
+            if frames:
+                schema, written = write_parquet(path, frames, self.partitions,
+                                                '{}-{:04d}'.format(self.token, self.nfiles))
+                files.extend(written)
+                self.nfiles += 1
+                self.schemas.setdefault(path, []).append(schema)
+                self.written[path] = self.written.get(path, 0) + sum(len(f) for f in frames)
+                frames.clear()
+        self.nbytes = 0
+        if self.journal is not None:
+            self.committed = {path: os.path.getsize(path) if os.path.exists(path) else 0
+                              for path in self.committed}
+            self.journal.write({'type': 'commit', 'offsets': self.committed,
+                                'units': self.done, 'parquet': files})
+            self.done = []
+
+    def close(self):
+        '''
+        Write the rows left and stop the writer.
+
+        Returns
+        -------
+        dict
+            Bytes written to each csv file and rows written to each
+            Parquet dataset.
+
+        Raises
+        ------
+        Exception
+            The first error of the writer thread, once it is stopped.
+        '''
+        if self.thread.ident is None:
+            # nothing was mapped
+            self.start()
+        self.queue.put(None)
+        self.thread.join()
+        self.manager.shutdown()
+        if self.pool is not None:
+            self.pool.shutdown()
+        if self.journal is not None:
+            self.journal.close()
+        if self.error is not None:
+            raise self.error
+        if self.schemas:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            for path, schemas in self.schemas.items():
+                pq.write_metadata(pa.unify_schemas(schemas),
+                                  os.path.join(path, '_common_metadata'))
+        return self.written
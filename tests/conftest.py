@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+import os
+import sys
+import glob
+import gzip
+import shutil
+import subprocess
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+EXAMPLE = os.path.join(ROOT, 'example')
+PSDB = os.path.join(EXAMPLE, '1-makestructuraldb', 'structural_db', 'structuralDB')
+VARDB = os.path.join(EXAMPLE, '2-makevariantsdb', 'DBs', 'varDB')
+ID_MAPPING = os.path.join(EXAMPLE, '3-mapper', 'dict_geneprot_GRCh38_uniprot.txt')
+
+sys.path.insert(0, ROOT)
+
+
+def run(*args, cwd):
+    '''
+    Run a 3Dmapper command (e.g. 'pack', ...) from cwd, where it writes
+    its log, and return the finished process.
+    '''
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    return subprocess.run([sys.executable, '-m', 'mapper'] + [str(a) for a in args],
+                          cwd=cwd, env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                          universal_newlines=True)
+
+
+def outputs(out_dir):
+    '''
+    Sorted rows of every csv and setID output of a run, by relative path,
+    decompressing gzip outputs.
+    '''
+    rows = {}
+    for path in glob.glob(os.path.join(out_dir, 'csv', '*.csv*')) + \
+            glob.glob(os.path.join(out_dir, 'setID_*.txt*')):
+        opener = gzip.open if path.endswith('.gz') else open
+        with opener(path, 'rt') as f:
+            lines = f.read().splitlines()
+        name = os.path.relpath(path, out_dir)
+        rows[name[:-3] if name.endswith('.gz') else name] = (lines[0], sorted(lines[1:]))
+    return rows
+
+
+@pytest.fixture
+def dbs(tmp_path):
+    '''
+    Copies of the example structural and variants databases and of the
+    ID mapping, which the mapper writes its manifests and index in.
+    '''
+    psdb, vardb = tmp_path / 'psdb', tmp_path / 'vardb'
+    shutil.copy(ID_MAPPING, tmp_path)
+    shutil.copytree(PSDB, psdb, ignore=shutil.ignore_patterns('.3dmapper*'))
+    shutil.copytree(VARDB, vardb, ignore=shutil.ignore_patterns('.3dmapper*'))
+    return psdb, vardb
+
+
+@pytest.fixture
+def mapper(dbs, tmp_path):
+    '''
+    Run the mapper on the example databases, returning the process.
+    '''
+    psdb, vardb = dbs
+
+    def run_mapper(out, *args, psdb=psdb, vardb=vardb):
+        return run('-psdb', psdb, '-vdb', vardb, '--id_mapping', os.path.basename(ID_MAPPING),
+                   '-csv', '-l', '-o', out, *args, cwd=tmp_path)
+    return run_mapper
@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+import shutil
+
+import pytest
+
+from mapper.consequences import load_terms, mask_bits, select_consequences, terms_file
+from mapper.db_parser import read_entry
+from mapper.manifest import Manifest
+
+
+@pytest.mark.parametrize('consequence', [['missense'], ['splice_region', 'stop_gained'],
+                                         ['UTR'], ['intron_variant$']])
+def test_mask_selects_as_consequence_column(dbs, consequence):
+    _, vardb = dbs
+    manifest = Manifest(str(vardb))
+    for id in ['ENST00000367182', 'ENST00000374005']:
+        entry = manifest.get(id)
+        df = read_entry(manifest.filepath(entry), entry)
+        assert 'Consequence_mask' in df.columns
+        by_column = df[df['Consequence'].astype(str).str.contains('|'.join(consequence))]
+        assert select_consequences(df, consequence, str(vardb)).index.equals(by_column.index)
+
+
+def test_terms_beyond_mask_bits(dbs):
+    _, vardb = dbs
+    assert len(load_terms(str(vardb))) <= mask_bits
+    extended = vardb.parent / 'extended'
+    shutil.copytree(vardb, extended)
+    with open(extended / terms_file, 'a') as f:
+        f.write(''.join('term_{}\n'.format(i) for i in range(mask_bits)))
+    # later terms have no bit: select on the Consequence column
+    assert load_terms(str(extended)) is None
@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+import pandas as pd
+
+from mapper.expand_ranges import expand_ranges
+
+
+def rows(df):
+    return [(v, None if pd.isna(p) else int(p))
+            for v, p in zip(df['Uploaded_variation'], df['Protein_position'])]
+
+
+def test_expand_ranges():
+    df = pd.DataFrame({'Uploaded_variation': ['a', 'b', 'c', 'd', 'e', 'f', 'g'],
+                       'Protein_position': ['12', '-', '120-122', '?-88', '120-?', '?-?', '9-7']})
+    expanded = expand_ranges(df)
+    assert str(expanded['Protein_position'].dtype) == 'Int32'
+    # unknown endpoints take the other one, '?-?' is not a position and
+    # empty ranges are dropped
+    assert rows(expanded) == [('a', 12), ('b', None), ('f', None),
+                              ('c', 120), ('c', 121), ('c', 122), ('d', 88), ('e', 120)]
+    # the input is left as it was
+    assert df['Protein_position'].tolist()[3:5] == ['?-88', '120-?']
+
+
+def test_expand_ranges_without_ranges():
+    df = pd.DataFrame({'Uploaded_variation': ['a', 'b'], 'Protein_position': ['5', '-']},
+                      index=[3, 4])
+    expanded = expand_ranges(df)
+    assert rows(expanded) == [('a', 5), ('b', None)]
+    assert expanded.index.tolist() == [3, 4]
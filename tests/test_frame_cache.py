@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+import pandas as pd
+
+from mapper.frame_cache import FrameCache
+
+
+def frame(n):
+    return pd.DataFrame({'Protein_position': range(n)}, dtype='int64')
+
+
+def size(df):
+    return int(df.memory_usage(index=True, deep=True).sum())
+
+
+def test_evicts_least_recently_used_by_size():
+    cache = FrameCache(2 * size(frame(100)) + size(frame(10)))
+    cache.put('a', frame(100))
+    cache.put('b', frame(100))
+    assert cache.get('a') is not None
+    # only 'b', the least recently used frame, has to go
+    cache.put('c', frame(50))
+    assert cache.get('b') is None
+    assert cache.get('a') is not None and cache.get('c') is not None
+    assert cache.nbytes == size(frame(100)) + size(frame(50)) <= cache.max_bytes
+    assert cache.counters() == {'hits': 3, 'misses': 1, 'evictions': 1}
+
+
+def test_small_frames_make_room_for_a_large_one():
+    cache = FrameCache(size(frame(50)) + size(frame(250)))
+    for key in 'abcd':
+        cache.put(key, frame(50))
+    cache.put('e', frame(250))
+    assert [key for key in 'abcde' if cache.get(key) is not None] == ['d', 'e']
+    assert cache.nbytes <= cache.max_bytes
+
+
+def test_frame_larger_than_cache_is_not_cached():
+    cache = FrameCache(size(frame(100)))
+    cache.put('a', frame(10))
+    cache.put('b', frame(1000))
+    assert cache.get('b') is None
+    assert cache.get('a') is not None
+    assert cache.counters()['evictions'] == 0
+
+
+def test_replacing_a_frame_updates_its_size():
+    cache = FrameCache(size(frame(1000)))
+    cache.put('a', frame(10))
+    cache.put('a', frame(100))
+    assert len(cache.get('a')) == 100
+    assert cache.nbytes == size(frame(100))
@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+import os
+
+from mapper import id_mapping
+from mapper.id_mapping import IDMapping, read_compiled_header
+
+MAPPING = '''geneID,transcriptID,protID
+ENSG01,ENST01,sp|P00001|ONE_HUMAN
+ENSG02,ENST02,sp|P00002|TWO_HUMAN
+'''
+
+
+def fail(*args):
+    raise AssertionError('ID mapping compiled again')
+
+
+def proteins(mapping, id):
+    return mapping.lookup(id)['protID'].tolist()
+
+
+def write_mapping(tmp_path, text=MAPPING):
+    path = tmp_path / 'mapping.txt'
+    path.write_text(text)
+    return str(path)
+
+
+def test_index_is_reused(tmp_path, monkeypatch):
+    path = write_mapping(tmp_path)
+    assert proteins(IDMapping(path), 'P00001') == ['sp|P00001|ONE_HUMAN']
+    monkeypatch.setattr(id_mapping, 'compile_id_mapping', fail)
+    assert proteins(IDMapping(path), 'ENSG02') == ['sp|P00002|TWO_HUMAN']
+
+
+def test_touched_file_is_revalidated(tmp_path, monkeypatch):
+    path = write_mapping(tmp_path)
+    IDMapping(path)
+    st = os.stat(path)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+    # same content: the index is kept and records the new modification time
+    monkeypatch.setattr(id_mapping, 'compile_id_mapping', fail)
+    assert proteins(IDMapping(path), 'P00001') == ['sp|P00001|ONE_HUMAN']
+    assert read_compiled_header(path + '.idx')['mtime_ns'] == st.st_mtime_ns + 10**9
+    monkeypatch.setattr(id_mapping, 'file_hash', fail)
+    IDMapping(path)
+
+
+def test_changed_size_rebuilds(tmp_path):
+    path = write_mapping(tmp_path)
+    IDMapping(path)
+    write_mapping(tmp_path, MAPPING + 'ENSG03,ENST03,sp|P00003|THREE_HUMAN\n')
+    assert proteins(IDMapping(path), 'P00003') == ['sp|P00003|THREE_HUMAN']
+
+
+def test_changed_content_of_same_size_rebuilds(tmp_path):
+    path = write_mapping(tmp_path)
+    IDMapping(path)
+    st = os.stat(path)
+    write_mapping(tmp_path, MAPPING.replace('P00002|TWO', 'P00009|TWO'))
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+    assert os.stat(path).st_size == st.st_size
+    mapping = IDMapping(path)
+    assert proteins(mapping, 'P00009') == ['sp|P00009|TWO_HUMAN']
+    assert proteins(mapping, 'P00002') == []
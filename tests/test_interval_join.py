@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+import gzip
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from conftest import outputs
+from mapper.interval_join import covered
+
+FGR = 'sp|P09769|FGR_HUMAN'
+
+
+def brute_force(positions, starts, ends):
+    return np.array([any(s <= p <= e for s, e in zip(starts, ends)) for p in positions],
+                    dtype=bool)
+
+
+@pytest.mark.parametrize('starts, ends', [
+    ([1, 5], [10, 15]),            # overlapping
+    ([1, 10, 30], [100, 20, 40]),  # nested, the outer range reaches past the inner ones
+    ([1, 6], [5, 10]),             # touching
+    ([7, 1], [10, 5]),             # not sorted, with a gap at 6
+    ([3], [3]),                    # a single position
+    ([], []),
+])
+def test_covered(starts, ends):
+    positions = np.arange(0, 110)
+    assert covered(positions, np.array(starts, dtype=int), np.array(ends, dtype=int)).tolist() == \
+        brute_force(positions, starts, ends).tolist()
+
+
+def test_unmapped_positions_are_inside_an_alignment(mapper, dbs, tmp_path):
+    '''
+    Keep only the 7jt9 structure of FGR (alignment 77-140) and drop the
+    residues at 84, 97 and 100 from it: the variants there are unmapped,
+    while the variants outside 77-140 are not reported at all.
+    '''
+    psdb, _ = dbs
+    path = psdb / (FGR + '.txt.gz')
+    df = pd.read_csv(path, sep='\t', dtype=str, keep_default_na=False)
+    df = df[df['PDB_code'].str.startswith('7jt9') & ~df['Protein_position'].isin(['84', '97', '100'])]
+    assert set(df[['Protein_alignment_start', 'Protein_alignment_end']].itertuples(index=False)) == \
+        {('77', '140')}
+    with gzip.open(path, 'wt') as f:
+        df.to_csv(f, sep='\t', index=False)
+
+    out = tmp_path / 'out'
+    assert mapper(out, '-pid', 'P09769').returncode == 0
+    results = outputs(out)
+
+    def positions(maptype):
+        name = 'csv/{}Positions_pident20.0_isoform_all_consequence_all.csv'.format(maptype)
+        header, rows = results[name]
+        column = header.split(',').index('Protein_position')
+        return {int(row.split(',')[column]) for row in rows}
+
+    assert positions('Unmapped') == {84, 97, 100}
+    assert all(77 <= p <= 140 for p in positions('Structure'))
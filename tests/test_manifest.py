@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+import shutil
+
+from mapper import manifest
+from mapper.manifest import Manifest
+
+MDM4 = 'sp|O15151|MDM4_HUMAN'
+
+
+def fail(*args):
+    raise AssertionError('directory listed again')
+
+
+def test_cached_manifest_is_trusted(dbs, monkeypatch):
+    psdb, _ = dbs
+    rows = Manifest(str(psdb)).get(MDM4)['rows']
+    monkeypatch.setattr(manifest, 'build_manifest', fail)
+    monkeypatch.setattr(manifest, 'describe', fail)
+    assert Manifest(str(psdb)).get(MDM4)['rows'] == rows
+
+
+def test_new_file_lists_directory_again(dbs):
+    psdb, _ = dbs
+    assert Manifest(str(psdb)).get('sp|NEW|NEW_HUMAN') is None
+    shutil.copy(psdb / (MDM4 + '.txt.gz'), psdb / 'sp|NEW|NEW_HUMAN.txt.gz')
+    assert Manifest(str(psdb)).get('sp|NEW|NEW_HUMAN') is not None
+
+
+def test_file_appended_in_place(dbs, monkeypatch):
+    _, vardb = dbs
+    id = 'ENST00000367182'
+    entry = Manifest(str(vardb)).get(id)
+    path = vardb / entry['name']
+    with open(path) as f:
+        last = f.read().splitlines()[-1]
+    with open(path, 'a') as f:
+        f.write(last + '\n')
+    assert Manifest(str(vardb)).get(id)['rows'] == entry['rows'] + 1
+    # the new description is cached
+    monkeypatch.setattr(manifest, 'describe', fail)
+    assert Manifest(str(vardb)).get(id)['rows'] == entry['rows'] + 1
@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+import os
+
+import pandas as pd
+
+from conftest import outputs, run
+from mapper.db_parser import read_entry
+from mapper.manifest import Manifest
+from mapper.packed import PACKED_DIR
+
+FGR = 'sp|P09769|FGR_HUMAN'
+
+
+def read_id(db_dir, id):
+    manifest = Manifest(str(db_dir))
+    entry = manifest.get(id)
+    return entry, read_entry(manifest.filepath(entry), entry)
+
+
+def values(column):
+    # typed columns read back numbers with their schema type and missing
+    # values as None or NaN
+    column = pd.to_numeric(column.astype(object), errors='ignore')
+    if pd.api.types.is_numeric_dtype(column):
+        column = column.astype(float)
+    return column.astype(object).where(column.notna(), '').astype(str)
+
+
+def same_rows(a, b):
+    a, b = a.apply(values), b[a.columns].apply(values)
+    return a.sort_values(list(a.columns)).reset_index(drop=True).equals(
+        b.sort_values(list(b.columns)).reset_index(drop=True))
+
+
+def test_convert_pack_round_trip(dbs):
+    psdb, _ = dbs
+    texts = os.listdir(psdb)
+    originals = {id: read_id(psdb, id)[1] for id in [FGR, 'sp|O15151|MDM4_HUMAN']}
+
+    assert run('convert', '-db', psdb, cwd=psdb.parent).returncode == 0
+    assert run('pack', '-db', psdb, cwd=psdb.parent).returncode == 0
+    # converted text files are kept, the columnar copies are packed
+    assert sorted(f for f in os.listdir(psdb) if not f.startswith('.')) == sorted(texts + [PACKED_DIR])
+    for id, df in originals.items():
+        entry, packed = read_id(psdb, id)
+        assert entry['offset'] >= 0 and entry['format'] != 'text'
+        assert same_rows(df, packed)
+
+
+def test_pack_merges_new_files(dbs):
+    psdb, _ = dbs
+    assert run('pack', '-db', psdb, cwd=psdb.parent).returncode == 0
+    _, fgr = read_id(psdb, FGR)
+    # file added for a packed ID
+    fgr.head(10).to_csv(psdb / (FGR + '.new.txt'), sep='\t', index=False)
+    assert len(read_id(psdb, FGR)[1]) == 10
+
+    assert run('pack', '-db', psdb, cwd=psdb.parent).returncode == 0
+    entry, merged = read_id(psdb, FGR)
+    assert entry['offset'] >= 0
+    assert len(merged) == len(fgr) + 10
+    assert same_rows(pd.concat([fgr, fgr.head(10)]), merged)
+
+
+def test_mapper_reads_packed_databases(dbs, mapper, tmp_path):
+    assert mapper(tmp_path / 'text', '-pid', 'P09769', 'O15151').returncode == 0
+    text = outputs(tmp_path / 'text')
+    assert text
+    for db in dbs:
+        assert run('convert', '-db', db, cwd=tmp_path).returncode == 0
+        assert run('pack', '-db', db, cwd=tmp_path).returncode == 0
+    assert mapper(tmp_path / 'packed', '-pid', 'P09769', 'O15151').returncode == 0
+    assert outputs(tmp_path / 'packed') == text
@@ -0,0 +1,16 @@
+# -*- coding: utf-8 -*-
+import pytest
+
+from conftest import outputs
+
+PROTEINS = ['-pid', 'P09769', 'O15151']
+
+
+@pytest.mark.parametrize('batch', [[], ['--batch']])
+def test_parallel_compressed_run_matches_serial_run(mapper, tmp_path, batch):
+    assert mapper(tmp_path / 'serial', *PROTEINS).returncode == 0
+    parallel = mapper(tmp_path / 'parallel', *PROTEINS, *batch, '-p', '-j', '2', '--compress', 'gzip')
+    assert parallel.returncode == 0
+    serial = outputs(tmp_path / 'serial')
+    assert serial
+    assert outputs(tmp_path / 'parallel') == serial
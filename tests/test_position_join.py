@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+import pandas as pd
+
+from mapper.position_join import position_join
+
+
+def test_position_join():
+    left = pd.DataFrame({'Protein_position': ['2', '-', '5', '2', '9', '7'],
+                         'Uploaded_variation': ['a', 'b', 'c', 'd', 'e', 'f']},
+                        index=[10, 11, 12, 13, 14, 15])
+    right = pd.DataFrame({'Protein_position': [1, 2, 2, 5, 7, 7, 7],
+                          'PDB_code': ['x', 'x', 'y', 'x', 'x', 'y', 'z']})
+    joined, matched = position_join(left, right)
+    # '-' and the position without structure (9) are unmatched
+    assert matched.tolist() == [True, False, True, True, False, True]
+    # repeated keys on both sides give every pair, in the order of left
+    assert list(joined.columns) == ['Protein_position', 'Uploaded_variation', 'PDB_code']
+    assert joined.index.tolist() == [10, 10, 12, 13, 13, 15, 15, 15]
+    assert list(zip(joined['Uploaded_variation'], joined['PDB_code'])) == [
+        ('a', 'x'), ('a', 'y'), ('c', 'x'), ('d', 'x'), ('d', 'y'),
+        ('f', 'x'), ('f', 'y'), ('f', 'z')]
+
+
+def test_position_join_by_group():
+    left = pd.DataFrame({'Protein_position': ['3', '3', '-', '4'], '_group': [0, 1, 1, 1]})
+    right = pd.DataFrame({'Protein_position': [3, 4, 3], '_group': [0, 0, 1],
+                          'PDB_code': ['x', 'y', 'z']})
+    joined, matched = position_join(left, right, group='_group')
+    # the same position of another protein does not match
+    assert matched.tolist() == [True, True, False, False]
+    assert joined['PDB_code'].tolist() == ['x', 'z']
+    assert list(joined.columns) == ['Protein_position', '_group', 'PDB_code']
+
+
+def test_position_join_without_matches():
+    left = pd.DataFrame({'Protein_position': ['-', '8']})
+    right = pd.DataFrame({'Protein_position': [1, 2], 'PDB_code': ['x', 'y']})
+    joined, matched = position_join(left, right)
+    assert not matched.any()
+    assert joined.empty
+    assert list(joined.columns) == ['Protein_position', 'PDB_code']
@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+import os
+import glob
+
+import pytest
+
+from conftest import outputs
+from mapper.journal import JOURNAL
+
+PROTEINS = ['-pid', 'P09769', 'O15151']
+
+
+def interrupt(out, cut_commit):
+    '''
+    Leave the outputs of a finished run as an interruption would: rows
+    written after the last commit and, if cut_commit, the commit record
+    itself cut while it was being written.
+    '''
+    journal = os.path.join(out, JOURNAL)
+    with open(journal) as f:
+        records = f.read().splitlines(keepends=True)
+    assert records[-1].startswith('{"type": "commit"')
+    if cut_commit:
+        records[-1] = records[-1][:len(records[-1]) // 2]
+    with open(journal, 'w') as f:
+        f.writelines(records)
+    for path in glob.glob(os.path.join(out, 'csv', '*.csv')) + \
+            glob.glob(os.path.join(out, 'setID_*.txt')):
+        with open(path, 'a') as f:
+            f.write('partial,row')
+
+
+@pytest.mark.parametrize('cut_commit', [False, True])
+def test_resume_after_interruption(mapper, tmp_path, cut_commit):
+    out = tmp_path / 'out'
+    assert mapper(out, *PROTEINS).returncode == 0
+    finished = outputs(out)
+    assert finished
+
+    interrupt(out, cut_commit)
+    assert mapper(out, *PROTEINS, '--resume').returncode == 0
+    assert outputs(out) == finished
+
+
+def test_resume_needs_same_options(mapper, tmp_path):
+    out = tmp_path / 'out'
+    assert mapper(out, *PROTEINS).returncode == 0
+    finished = outputs(out)
+
+    interrupt(out, cut_commit=False)
+    assert mapper(out, *PROTEINS, '-c', 'missense', '--resume').returncode != 0
+    # the outputs are left as they were
+    assert outputs(out) != finished
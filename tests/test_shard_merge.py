@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+import random
+
+import pytest
+
+from conftest import outputs, run
+from mapper.planner import shard_assignment
+
+PROTEINS = ['-pid', 'P09769', 'O15151', 'P0CG47', 'Q00987']
+
+
+@pytest.mark.parametrize('nshards', [2, 3])
+def test_merged_shards_match_unsharded_run(mapper, tmp_path, nshards):
+    assert mapper(tmp_path / 'all', *PROTEINS).returncode == 0
+    for i in range(1, nshards + 1):
+        shard = mapper(tmp_path / 'shards', *PROTEINS, '--shard', '{}/{}'.format(i, nshards))
+        assert shard.returncode == 0
+    assert run('merge', '-o', tmp_path / 'merged', tmp_path / 'shards', cwd=tmp_path).returncode == 0
+    unsharded = outputs(tmp_path / 'all')
+    assert unsharded
+    assert outputs(tmp_path / 'merged') == unsharded
+
+
+def test_shard_assignment_ignores_unit_order():
+    units = [(('protein', 'P{}'.format(i)), random.randint(1, 5)) for i in range(50)]
+    keys, costs = zip(*units)
+    assignment = shard_assignment(keys, costs, 4)
+    assert sorted(set(assignment.values())) == [1, 2, 3, 4]
+    for _ in range(5):
+        random.shuffle(units)
+        keys, costs = zip(*units)
+        assert shard_assignment(keys, costs, 4) == assignment
+
+
+def test_merged_parquet_shards_match_unsharded_run(mapper, tmp_path):
+    import pyarrow.dataset as ds
+
+    def dataset(out):
+        path, = (out / 'parquet').iterdir()
+        df = ds.dataset(str(path), format='parquet', partitioning='hive').to_table().to_pandas()
+        return df.astype(str).sort_values(list(df.columns)).reset_index(drop=True)
+
+    assert mapper(tmp_path / 'all', *PROTEINS, '-parquet').returncode == 0
+    for i in [1, 2]:
+        assert mapper(tmp_path / 'shards', *PROTEINS, '-parquet', '--shard', '{}/2'.format(i)).returncode == 0
+    assert run('merge', '-o', tmp_path / 'merged', tmp_path / 'shards', cwd=tmp_path).returncode == 0
+    assert dataset(tmp_path / 'merged').equals(dataset(tmp_path / 'all'))
@@ -0,0 +1,18 @@
+# -*- coding: utf-8 -*-
+from mapper.translate import translate_many
+
+MAPPING = '''isoform,geneID,transcriptID,protID
+principal1,ENSG01,ENST01,sp|P00001|ONE_HUMAN
+alternative1,ENSG01,ENST02,sp|P00002|TWO_HUMAN
+alternative1,ENSG03,ENST03,sp|P00003|THREE_HUMAN
+'''
+
+
+def test_isoform_filtered_ids_are_not_unresolved(tmp_path):
+    dict_geneprot = tmp_path / 'mapping.txt'
+    dict_geneprot.write_text(MAPPING)
+    df, unresolved, filtered = translate_many(['ENSG01', 'P00003', 'P99999'], str(tmp_path),
+                                              str(dict_geneprot), ['principal1'])
+    assert df['protID'].tolist() == ['sp|P00001|ONE_HUMAN']
+    assert unresolved == ['P99999']
+    assert filtered == ['P00003']
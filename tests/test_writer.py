@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+import os
+import gzip
+
+import pandas as pd
+
+from mapper.merge import BlockWriter, open_text
+from mapper.writer import compress_block
+
+
+def test_gzip_blocks_read_as_one_file(tmp_path):
+    blocks = ['a,b\n'] + ['{},{}\n'.format(i, i * i) for i in range(1000)]
+    path = tmp_path / 'out.csv.gz'
+    with open(path, 'wb') as f:
+        for block in blocks:
+            f.write(compress_block(block, 'gzip'))
+    with gzip.open(path, 'rt') as f:
+        assert f.read() == ''.join(blocks)
+
+
+def test_block_writer_round_trip(tmp_path):
+    rows = ['{},x\n'.format(i) for i in range(5000)]
+    for name in ['out.csv', 'out.csv.gz']:
+        out = BlockWriter(str(tmp_path / name), block_bytes=1024)
+        out.write('n,x\n')
+        for row in rows:
+            out.write(row)
+        out.close()
+        with open_text(str(tmp_path / name)) as f:
+            assert f.read() == 'n,x\n' + ''.join(rows)
+
+
+def test_write_parquet_partitions(tmp_path, monkeypatch):
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+    from mapper import writer
+    monkeypatch.setattr(writer, 'row_group_rows', 10)
+    df = pd.DataFrame({'Protein_accession': ['P{}'.format(i % 7) for i in range(45)],
+                       'Location': ['1:{}'.format(i) for i in range(45)],
+                       'Interaction_type': [None if i % 3 else 'ligand' for i in range(45)],
+                       'Mapping_position': ['Structure'] * 30 + ['Interface'] * 15})
+    schema, files = writer.write_parquet(str(tmp_path), [df.iloc[:20], df.iloc[20:]],
+                                         ['Mapping_position', 'Interaction_type'], 'test')
+    assert schema.names == list(df.columns)
+    assert sorted(os.path.relpath(os.path.dirname(f), str(tmp_path)) for f in files) == [
+        'Mapping_position=Interface/Interaction_type=__HIVE_DEFAULT_PARTITION__',
+        'Mapping_position=Interface/Interaction_type=ligand',
+        'Mapping_position=Structure/Interaction_type=__HIVE_DEFAULT_PARTITION__',
+        'Mapping_position=Structure/Interaction_type=ligand']
+    for f in files:
+        metadata = pq.ParquetFile(f).metadata
+        assert all(metadata.row_group(i).num_rows <= 10 for i in range(metadata.num_row_groups))
+    table = ds.dataset(str(tmp_path), format='parquet', partitioning='hive').to_table()
+    read = table.to_pandas()[list(df.columns)].astype(object)
+    read = read.where(read.notna(), None).sort_values('Location').reset_index(drop=True)
+    assert read.equals(df.astype(object).sort_values('Location').reset_index(drop=True))